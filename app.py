@@ -3,10 +3,237 @@ Vanna AI Text-to-SQL —— Streamlit 自定义 UI
 底层使用 Vanna 库（ChromaDB 向量检索 + 可切换 LLM）
 """
 import os
+import weakref
+from contextlib import ExitStack, contextmanager
+
 import streamlit as st
 import pandas as pd
 
-from vanna_config import create_vanna, load_config, save_config
+from charts import prepare_chart
+from export import EXPORT_FORMATS, export_to_file
+from learning import get_learning_queue
+from approx import get_approx_runner
+from tenants import TenantPool, tenant_config
+from vanna_config import load_config, save_config
+from warmup import create_warm_vanna, write_readiness_file
+
+# 以下配置项只能在 config.json 中编辑，保存侧边栏配置时需原样保留
+FILE_ONLY_KEYS = ("databases", "default_database", "max_tenants", "tenant_idle_seconds", "readiness_file", "approx")
+
+
+def render_chart(df: pd.DataFrame):
+    """在服务端压缩数据后再画图，图表数据点数与结果行数无关。"""
+    chart = prepare_chart(df)
+    if chart is None:
+        return
+    chart_type, data = chart
+    if len(data) < len(df):
+        st.caption(f"图表已从 {len(df)} 行压缩为 {len(data)} 个数据点")
+    if chart_type == "line":
+        st.line_chart(data)
+    elif chart_type == "scatter":
+        st.scatter_chart(data.reset_index(), x=data.index.name, y=data.name)
+    else:
+        st.bar_chart(data)
+
+
+def run_sql_with_approx(vn, sql: str, cfg: dict):
+    """近似模式：可近似的聚合查询先展示抽样结果，精确结果算完后替换；其他查询直接执行。
+
+    近似模式出错（如抽样表不可用）时退回精确查询。
+    """
+    try:
+        runner = get_approx_runner(vn, cfg)
+        approx = runner.run(sql) if runner else None
+    except Exception as e:
+        print(f"近似查询不可用，改为精确查询：{e}")
+        approx = None
+    if approx is None:
+        return vn.run_sql(sql)
+
+    approx_df, info, exact = approx
+    if approx_df is None:
+        return exact.result()
+    placeholder = st.empty()
+    with placeholder.container():
+        st.markdown(f"**近似结果（基于 `{info['table']}` 的 {info['rate']:.0%} 抽样，±95% 为置信区间半宽）：**")
+        st.dataframe(approx_df, use_container_width=True)
+        st.caption("⏳ 正在计算精确结果，完成后自动替换...")
+    df = exact.result()
+    placeholder.empty()
+    return df
+
+
+def _remove_files(paths: set):
+    for path in paths:
+        if os.path.exists(path):
+            os.remove(path)
+
+
+class ExportFiles:
+    """本会话生成的导出临时文件：会话结束（session_state 被回收）或进程退出时删除。"""
+
+    def __init__(self):
+        self.paths = set()
+        weakref.finalize(self, _remove_files, self.paths)
+
+    def replace(self, old: str, new: str = None):
+        if old:
+            _remove_files({old})
+            self.paths.discard(old)
+        if new:
+            self.paths.add(new)
+
+
+def render_export_buttons(vanna_for, msg: dict, key: str):
+    """重新执行 SQL 并分块写入文件，导出完整结果（而不是页面上的预览）。
+
+    vanna_for(msg) 是返回该消息所属数据库实例的上下文管理器，只在点击时才取实例。
+    """
+    files = st.session_state.setdefault("export_files", ExportFiles())
+    cols = st.columns(len(EXPORT_FORMATS))
+    for col, fmt in zip(cols, EXPORT_FORMATS):
+        if col.button(f"📥 导出完整结果（{fmt.upper()}）", key=f"{key}_{fmt}"):
+            old = msg.pop("export", None)
+            files.replace(old and old[1])
+            try:
+                with st.spinner("正在导出..."), vanna_for(msg) as vn:
+                    msg["export"] = (fmt, export_to_file(vn, msg["sql"], fmt))
+            except Exception as e:
+                st.error(f"导出失败：{e}")
+                return
+            files.replace(None, msg["export"][1])
+    if msg.get("export"):
+        fmt, path = msg["export"]
+        if not os.path.exists(path):
+            msg.pop("export")
+            return
+        with open(path, "rb") as f:
+            st.download_button(f"⬇️ 下载 {fmt.upper()}", f, file_name=f"result.{fmt}", key=f"{key}_download")
+
+
+def render_learn_button(vanna_for, msg: dict, key: str):
+    """「答案正确」按钮：把 question→SQL 对放入所属数据库的后台学习队列，不阻塞页面。"""
+    if msg.get("learned"):
+        st.caption("✅ 已加入训练队列")
+    elif st.button("👍 答案正确，加入训练", key=key):
+        try:
+            with vanna_for(msg) as vn:
+                get_learning_queue(vn).submit(msg["question"], msg["sql"])
+        except Exception as e:
+            st.error(f"加入训练失败：{e}")
+            return
+        msg["learned"] = True
+        st.caption("✅ 已加入训练队列")
+
+
+def render_chat(vn, approx_cfg: dict, db_key: str = None, pool: TenantPool = None):
+    """训练数据统计 + 聊天区域。多数据库模式下 db_key 为当前数据库，pool 用于取历史消息所属的数据库。"""
+
+    @contextmanager
+    def vanna_for(msg: dict):
+        # 切换数据库后，历史消息的导出和训练仍作用于产生它的数据库
+        key = msg.get("db_key")
+        if pool is None or key == db_key:
+            yield vn
+        else:
+            with pool.lease(key) as other:
+                yield other
+
+    # 训练数据统计
+    try:
+        training_data = vn.get_training_data()
+        if training_data.empty:
+            st.warning("⚠️ 暂无训练数据，请先运行 `python train.py` 导入 schema 和示例。")
+        else:
+            counts = training_data["training_data_type"].value_counts().to_dict()
+            cols = st.columns(3)
+            cols[0].metric("DDL", counts.get("ddl", 0))
+            cols[1].metric("文档", counts.get("documentation", 0))
+            cols[2].metric("Q&A 对", counts.get("sql", 0))
+    except Exception:
+        pass
+
+    st.success("✅ Vanna 已就绪！输入自然语言问题，AI 会检索相关 schema 并生成 SQL。")
+
+    # 聊天历史
+    if "messages" not in st.session_state:
+        st.session_state.messages = []
+
+    # 显示历史消息
+    for i, msg in enumerate(st.session_state.messages):
+        with st.chat_message(msg["role"]):
+            st.markdown(msg["content"])
+            if pool is not None and msg.get("db_key") not in (None, db_key):
+                st.caption(f"🗄️ 数据库：{msg['db_key']}")
+            if "sql" in msg:
+                st.code(msg["sql"], language="sql")
+            if "df" in msg and msg["df"] is not None:
+                st.dataframe(msg["df"], use_container_width=True)
+            if msg.get("df") is not None:
+                render_export_buttons(vanna_for, msg, key=f"export_{i}")
+            if "question" in msg:
+                render_learn_button(vanna_for, msg, key=f"learn_{i}")
+
+    # 用户输入
+    if question := st.chat_input("输入你的问题，例如：每个部门的平均薪资是多少？"):
+        st.session_state.messages.append({"role": "user", "content": question})
+        with st.chat_message("user"):
+            st.markdown(question)
+
+        with st.chat_message("assistant"):
+            with st.spinner("🧠 Vanna 正在检索相关 schema 并生成 SQL..."):
+                try:
+                    sql = vn.generate_sql(question=question)
+
+                    if sql and sql.strip():
+                        st.markdown("**生成的 SQL：**")
+                        st.code(sql, language="sql")
+
+                        df = run_sql_with_approx(vn, sql, approx_cfg)
+
+                        if df is not None and not df.empty:
+                            st.markdown(f"**查询结果（{len(df)} 行）：**")
+                            st.dataframe(df, use_container_width=True)
+
+                            try:
+                                render_chart(df)
+                            except Exception:
+                                pass
+
+                            msg = {
+                                "role": "assistant",
+                                "content": f"查询结果（{len(df)} 行）：",
+                                "question": question,
+                                "sql": sql,
+                                "df": df,
+                                "db_key": db_key,
+                            }
+                            render_export_buttons(vanna_for, msg, key=f"export_{len(st.session_state.messages)}")
+                            render_learn_button(vanna_for, msg, key=f"learn_{len(st.session_state.messages)}")
+                            st.session_state.messages.append(msg)
+                        else:
+                            st.info("查询执行成功，但没有返回数据。")
+                            st.session_state.messages.append({
+                                "role": "assistant",
+                                "content": "查询执行成功，但没有返回数据。",
+                                "sql": sql,
+                                "db_key": db_key,
+                            })
+                    else:
+                        st.warning("无法生成 SQL，请尝试换一种方式描述你的问题。")
+                        st.session_state.messages.append({
+                            "role": "assistant",
+                            "content": "无法生成 SQL，请尝试换一种方式描述你的问题。",
+                        })
+
+                except Exception as e:
+                    error_msg = f"出错了：{str(e)}"
+                    st.error(error_msg)
+                    st.session_state.messages.append({
+                        "role": "assistant",
+                        "content": error_msg,
+                    })
 
 
 # ──────────────────────────────────────────────
@@ -68,6 +295,18 @@ def main():
         st.divider()
         st.header("🗄️ 数据库")
 
+        # 多数据库模式：数据库连接在 config.json 的 databases 中配置，这里只切换
+        db_key = None
+        if cfg.get("databases"):
+            db_keys = list(cfg["databases"])
+            db_key = st.selectbox(
+                "当前数据库",
+                db_keys,
+                index=db_keys.index(cfg.get("default_database", db_keys[0])),
+                help="多数据库模式，每个数据库使用独立的训练数据和连接池",
+            )
+            st.caption("以下为未指定 databases 时使用的单库配置")
+
         db_type = st.selectbox(
             "数据库类型",
             ["sqlite", "mysql"],
@@ -106,6 +345,9 @@ def main():
                     "db_password": db_password,
                     "db_name": db_name,
                 })
+            for key in FILE_ONLY_KEYS:
+                if key in cfg:
+                    new_cfg[key] = cfg[key]
             save_config(new_cfg)
             st.success("配置已保存！")
             st.rerun()
@@ -137,100 +379,45 @@ def main():
     # 初始化 Vanna（缓存避免重复创建）
     @st.cache_resource
     def get_vanna(_cfg_hash):
-        return create_vanna(load_config())
-
-    cfg_hash = str(sorted(cfg.items()))
-    try:
-        vn = get_vanna(cfg_hash)
-    except Exception as e:
-        st.error(f"初始化失败：{e}")
-        st.stop()
-
-    # 训练数据统计
-    try:
-        training_data = vn.get_training_data()
-        if training_data.empty:
-            st.warning("⚠️ 暂无训练数据，请先运行 `python train.py` 导入 schema 和示例。")
-        else:
-            counts = training_data["training_data_type"].value_counts().to_dict()
-            cols = st.columns(3)
-            cols[0].metric("DDL", counts.get("ddl", 0))
-            cols[1].metric("文档", counts.get("documentation", 0))
-            cols[2].metric("Q&A 对", counts.get("sql", 0))
-    except Exception:
-        pass
-
-    st.success("✅ Vanna 已就绪！输入自然语言问题，AI 会检索相关 schema 并生成 SQL。")
-
-    # 聊天历史
-    if "messages" not in st.session_state:
-        st.session_state.messages = []
-
-    # 显示历史消息
-    for msg in st.session_state.messages:
-        with st.chat_message(msg["role"]):
-            st.markdown(msg["content"])
-            if "sql" in msg:
-                st.code(msg["sql"], language="sql")
-            if "df" in msg and msg["df"] is not None:
-                st.dataframe(msg["df"], use_container_width=True)
-
-    # 用户输入
-    if question := st.chat_input("输入你的问题，例如：每个部门的平均薪资是多少？"):
-        st.session_state.messages.append({"role": "user", "content": question})
-        with st.chat_message("user"):
-            st.markdown(question)
-
-        with st.chat_message("assistant"):
-            with st.spinner("🧠 Vanna 正在检索相关 schema 并生成 SQL..."):
-                try:
-                    sql = vn.generate_sql(question=question)
-
-                    if sql and sql.strip():
-                        st.markdown("**生成的 SQL：**")
-                        st.code(sql, language="sql")
-
-                        df = vn.run_sql(sql)
-
-                        if df is not None and not df.empty:
-                            st.markdown(f"**查询结果（{len(df)} 行）：**")
-                            st.dataframe(df, use_container_width=True)
+        # 预热后再返回，后续会话拿到的实例首个请求也不慢
+        vn = create_warm_vanna(load_config())
+        if cfg.get("readiness_file"):
+            # 预热失败时实例在后台重试，每次结束都更新文件
+            path = cfg["readiness_file"]
+            vn.readiness.add_listener(lambda readiness: write_readiness_file(readiness, path))
+            write_readiness_file(vn.readiness, path)
+        return vn
 
-                            if len(df.columns) >= 2 and len(df) > 1:
-                                try:
-                                    numeric_cols = df.select_dtypes(include=["number"]).columns
-                                    if len(numeric_cols) >= 1:
-                                        st.bar_chart(df.set_index(df.columns[0])[numeric_cols[0]])
-                                except Exception:
-                                    pass
-
-                            st.session_state.messages.append({
-                                "role": "assistant",
-                                "content": f"查询结果（{len(df)} 行）：",
-                                "sql": sql,
-                                "df": df,
-                            })
-                        else:
-                            st.info("查询执行成功，但没有返回数据。")
-                            st.session_state.messages.append({
-                                "role": "assistant",
-                                "content": "查询执行成功，但没有返回数据。",
-                                "sql": sql,
-                            })
-                    else:
-                        st.warning("无法生成 SQL，请尝试换一种方式描述你的问题。")
-                        st.session_state.messages.append({
-                            "role": "assistant",
-                            "content": "无法生成 SQL，请尝试换一种方式描述你的问题。",
-                        })
+    @st.cache_resource
+    def get_tenant_pool(_cfg_hash):
+        return TenantPool(load_config(), factory=create_warm_vanna)
 
-                except Exception as e:
-                    error_msg = f"出错了：{str(e)}"
-                    st.error(error_msg)
-                    st.session_state.messages.append({
-                        "role": "assistant",
-                        "content": error_msg,
-                    })
+    cfg_hash = str(sorted(cfg.items()))
+    # 多数据库模式下本次运行期间租用实例，避免页面还在使用时被回收关闭
+    with ExitStack() as stack:
+        try:
+            if cfg.get("databases"):
+                vn = stack.enter_context(get_tenant_pool(cfg_hash).lease(db_key))
+            else:
+                vn = get_vanna(cfg_hash)
+            # 启动后台学习队列，重放上次未写入的条目
+            get_learning_queue(vn)
+        except Exception as e:
+            st.error(f"初始化失败：{e}")
+            st.stop()
+
+        # 近似查询配置按数据库区分（多数据库模式下可在 databases.<key>.approx 中覆盖）；
+        # 抽样表在后台构建，构建完成前或失败时查询走精确模式
+        approx_cfg = tenant_config(cfg, db_key) if cfg.get("databases") else cfg
+        try:
+            runner = get_approx_runner(vn, approx_cfg)
+        except Exception as e:
+            runner = None
+            st.sidebar.warning(f"近似查询不可用：{e}")
+        if runner is not None and runner.error:
+            st.sidebar.warning(f"近似查询不可用，使用精确查询：{runner.error}")
+
+        render_chat(vn, approx_cfg, db_key, get_tenant_pool(cfg_hash) if cfg.get("databases") else None)
 
 
 if __name__ == "__main__":
@@ -1,14 +1,57 @@
 """
 Vanna Flask UI —— 一键启动，快速体验
 用法：python app_flask.py
+
+配置了 databases 时进入多数据库模式：访问 /db/<key> 切换当前数据库，
+API 请求也可以通过 ?db=<key> 或请求头 X-Database 指定。
 """
+import os
+import threading
+
+from flask import Response, g, has_request_context, jsonify, redirect, request, send_file, stream_with_context
 from vanna.legacy.flask import VannaFlaskApp
+from export import EXPORT_FORMATS, export_to_file, stream_csv
+from learning import get_learning_queue
+from tenants import TenantPool, TenantRouter
 from vanna_config import create_vanna, load_config
+from warmup import Readiness, create_warm_vanna, start_warm_up
+
+DB_COOKIE = "vanna_db"
+
+
+def _explicit_db_key():
+    return request.args.get("db") or request.headers.get("X-Database")
+
+
+def _request_db_key(known_keys) -> str:
+    # 启动阶段（无请求上下文）使用默认数据库；过期的 cookie（数据库已从配置中移除）同样回退到默认数据库
+    if not has_request_context():
+        return None
+    key = _explicit_db_key() or request.cookies.get(DB_COOKIE)
+    return key if key in known_keys else None
+
+
+def _request_store():
+    # 每个请求租用一次实例，存放在 flask.g 中，请求结束时归还
+    return g if has_request_context() else None
+
+
+def _warm_default_tenant(pool):
+    try:
+        pool.get()
+    except Exception as e:
+        # 创建失败时由 /health/ready 或第一个请求重新创建
+        print(f"默认数据库预热失败：{e}")
 
 
 def main():
     cfg = load_config()
-    vn = create_vanna(cfg)
+    if cfg.get("databases"):
+        pool = TenantPool(cfg, factory=create_warm_vanna)
+        vn = TenantRouter(pool, lambda: _request_db_key(pool.keys), _request_store)
+    else:
+        pool = None
+        vn = create_vanna(cfg)
 
     app = VannaFlaskApp(
         vn,
@@ -17,6 +60,97 @@ def main():
         show_training_data=True,
         allow_llm_to_see_data=True,
     )
+
+    if pool is not None:
+        # 显式指定了未配置的数据库时直接返回 404
+        @app.flask_app.before_request
+        def check_db_key():
+            key = _explicit_db_key()
+            if key and key not in pool.keys:
+                return jsonify({"type": "error", "error": f"未配置的数据库: {key}"}), 404
+
+        # 流式响应（stream_with_context）结束后才会执行，导出期间实例不会被关闭
+        @app.flask_app.teardown_request
+        def release_tenant(exc):
+            vn.release(g)
+
+    # 「结果正确」提交的 question→SQL 对走后台学习队列，不阻塞请求
+    train_view = app.flask_app.view_functions["add_training_data"]
+
+    @app.requires_auth
+    def add_training_data(user):
+        body = request.get_json(silent=True) or {}
+        if body.get("question") and body.get("sql") and not body.get("ddl") and not body.get("documentation"):
+            queue = get_learning_queue(vn._current() if pool is not None else vn)
+            return jsonify({"id": queue.submit(body["question"], body["sql"])})
+        return train_view()
+
+    app.flask_app.view_functions["add_training_data"] = add_training_data
+
+    # 导出完整结果：重新执行已缓存的 SQL，CSV 流式返回，Parquet 分块落盘后下载
+    @app.flask_app.route("/api/v0/export", methods=["GET"])
+    @app.requires_auth
+    def export_results(user):
+        id = request.args.get("id")
+        fmt = request.args.get("format", "csv")
+        sql = app.cache.get(id=id, field="sql") if id else None
+        if sql is None:
+            return jsonify({"type": "error", "error": "No SQL found"}), 404
+        if fmt not in EXPORT_FORMATS:
+            return jsonify({"type": "error", "error": f"不支持的导出格式: {fmt}"}), 400
+
+        if fmt == "csv":
+            return Response(
+                stream_with_context(stream_csv(vn, sql)),
+                mimetype="text/csv",
+                headers={"Content-Disposition": f"attachment; filename={id}.csv"},
+            )
+        path = export_to_file(vn, sql, fmt)
+        resp = send_file(path, as_attachment=True, download_name=f"{id}.{fmt}")
+        resp.call_on_close(lambda: os.remove(path))
+        return resp
+
+    # 就绪检查：预热完成前 /health/ready 返回 503，负载均衡据此决定是否转发流量
+    if pool is None:
+        single_readiness = start_warm_up(vn)
+    else:
+        # 多数据库模式同样在启动时后台创建并预热默认数据库，不等第一个请求
+        default_warm_up = threading.Thread(target=_warm_default_tenant, args=(pool,), name="warm-up", daemon=True)
+        default_warm_up.start()
+
+    def current_readiness():
+        if pool is None:
+            return single_readiness
+        if default_warm_up.is_alive():
+            # 启动预热还没结束，直接报告未就绪，探针不阻塞在实例创建上
+            return Readiness()
+        # 每次取默认数据库当前的实例：被回收后重建的实例有自己的就绪状态，预热失败的实例在后台重试
+        return pool.get().readiness
+
+    @app.flask_app.route("/health/live", methods=["GET"])
+    def health_live():
+        return jsonify({"status": "alive"})
+
+    @app.flask_app.route("/health/ready", methods=["GET"])
+    def health_ready():
+        try:
+            readiness = current_readiness()
+        except Exception as e:
+            # 默认数据库实例创建失败（如数据库不可达），下次检查时重新创建
+            return jsonify({"status": "failed", "error": str(e)}), 503
+        return jsonify(readiness.to_dict()), 200 if readiness.ready else 503
+
+    if pool is None:
+        get_learning_queue(vn)
+    else:
+        @app.flask_app.route("/db/<key>")
+        def switch_db(key):
+            if key not in pool.keys:
+                return f"未配置的数据库: {key}", 404
+            resp = redirect("/")
+            resp.set_cookie(DB_COOKIE, key)
+            return resp
+
     app.run(host="0.0.0.0", port=8084)
 
 
@@ -0,0 +1,401 @@
+"""
+近似快速回答：对大表上的聚合查询，先在随机抽样表上执行并给出误差范围，同时在后台跑精确查询。
+
+config.json 示例：
+    "approx": {
+      "tables": {"orders": 0.1},          # 表名 → 抽样率，也可写 {"rate": 0.1, "key": "id"}
+      "refresh_seconds": 600              # 增量刷新抽样表的间隔
+    }
+
+抽样表 _approx_<table> 与原表在同一个库里，按主键（默认 id）增量追加新行，每行以固定概率独立入选
+（Poisson 抽样）。改写规则：原表替换为抽样表，COUNT / SUM 按 1/抽样率放大，AVG 不变；
+每个聚合列额外给出 95% 置信区间的半宽（Horvitz-Thompson 方差估计）。
+
+只改写顶层单条 SELECT：不含子查询、UNION、HAVING、DISTINCT 聚合、MIN / MAX 等无法从样本估计的写法，
+抽样表也不能在外连接可为空的一侧。误差范围只对「整列就是一个聚合调用」的列给出，聚合的组合表达式只放大不给误差。
+"""
+import math
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+import pandas as pd
+
+SAMPLE_PREFIX = "_approx_"
+STATE_TABLE = "_approx_state"
+Z_95 = 1.96
+
+_AGG_RE = re.compile(r"\b(COUNT|SUM|AVG)\s*\(", re.IGNORECASE)
+_UNSUPPORTED_RE = re.compile(
+    r"\b(MIN|MAX|GROUP_CONCAT|STDDEV\w*|VARIANCE|VAR_\w+|MEDIAN|UNION|INTERSECT|EXCEPT|HAVING|OVER)\b|\b(COUNT|SUM|AVG)\s*\(\s*DISTINCT\b",
+    re.IGNORECASE,
+)
+
+_CLAUSE_KEYWORDS = {
+    "WHERE", "GROUP", "ORDER", "LIMIT", "JOIN", "INNER", "LEFT", "RIGHT", "FULL", "CROSS", "OUTER", "ON", "USING",
+}
+
+
+# ── 抽样表维护 ──
+
+def _table_settings(approx_cfg: dict) -> dict:
+    """返回 {table: (rate, key)}。"""
+    settings = {}
+    for table, value in approx_cfg.get("tables", {}).items():
+        if isinstance(value, dict):
+            rate, key = value.get("rate", 0.1), value.get("key", "id")
+        else:
+            rate, key = value, "id"
+        if not 0 < rate < 1:
+            raise ValueError(f"表 {table} 的抽样率必须在 0 和 1 之间: {rate}")
+        settings[table] = (float(rate), key)
+    return settings
+
+
+def _random_predicate(dialect: str, rate: float) -> str:
+    if dialect == "SQLite":
+        return f"(abs(random()) % 1000000) < {int(rate * 1000000)}"
+    return f"RAND() < {rate}"
+
+
+@contextmanager
+def _refresh_lock(cursor, dialect: str, table: str, timeout: int = 60):
+    """跨进程互斥地刷新同一张抽样表，避免多个进程 / 副本读到同一水位后重复插入样本。
+
+    SQLite：BEGIN IMMEDIATE 取得写锁并开启事务，其他连接的刷新在此等待。
+    MySQL：GET_LOCK 咨询锁（会话级，DDL 的隐式提交不会释放它），事务由调用方开启。
+    """
+    if dialect == "SQLite":
+        cursor.execute("BEGIN IMMEDIATE")
+        yield
+        return
+    name = f"vanna{STATE_TABLE}_{table}"
+    cursor.execute(f"SELECT GET_LOCK('{name}', {timeout})")
+    if cursor.fetchone()[0] != 1:
+        raise TimeoutError(f"等待抽样表 {SAMPLE_PREFIX}{table} 的刷新锁超时")
+    try:
+        yield
+    finally:
+        cursor.execute(f"SELECT RELEASE_LOCK('{name}')")
+        cursor.fetchall()
+
+
+def _refresh_table(cursor, dialect: str, table: str, rate: float, key: str) -> int:
+    """在已开启的事务中刷新一张抽样表，返回新增行数。样本插入与水位更新在同一事务中提交。"""
+    sample = SAMPLE_PREFIX + table
+    mysql = dialect != "SQLite"
+    if mysql:
+        cursor.execute("START TRANSACTION")
+    cursor.execute(f"SELECT rate, last_key FROM {STATE_TABLE} WHERE tbl = '{table}'" + (" FOR UPDATE" if mysql else ""))
+    row = cursor.fetchone()
+    if row is None or abs(row[0] - rate) > 1e-12:
+        cursor.execute(f"DROP TABLE IF EXISTS {sample}")
+        cursor.execute(f"CREATE TABLE {sample} AS SELECT * FROM {table} WHERE 1 = 0")
+        if mysql:
+            # MySQL 的 DDL 会隐式提交，重新开启事务（重建期间由咨询锁保证互斥）
+            cursor.execute("START TRANSACTION")
+        cursor.execute(f"DELETE FROM {STATE_TABLE} WHERE tbl = '{table}'")
+        cursor.execute(f"INSERT INTO {STATE_TABLE} (tbl, rate, last_key) VALUES ('{table}', {rate}, NULL)")
+        last_key = None
+    else:
+        last_key = row[1]
+
+    cursor.execute(f"SELECT MAX({key}) FROM {table}")
+    max_key = cursor.fetchone()[0]
+    if max_key is None or (last_key is not None and max_key <= last_key):
+        return 0
+    lower = f"{key} > {last_key} AND " if last_key is not None else ""
+    cursor.execute(
+        f"INSERT INTO {sample} SELECT * FROM {table} "
+        f"WHERE {lower}{key} <= {max_key} AND {_random_predicate(dialect, rate)}"
+    )
+    added = cursor.rowcount
+    cursor.execute(f"UPDATE {STATE_TABLE} SET last_key = {max_key} WHERE tbl = '{table}'")
+    return added
+
+
+def refresh_samples(vn, approx_cfg: dict) -> dict:
+    """增量刷新所有抽样表，返回 {table: 新增行数}。抽样率变化时重建。"""
+    dialect = getattr(vn, "dialect", "SQLite")
+    added = {}
+    with vn.db_pool.connection() as conn:
+        cursor = conn.cursor()
+        try:
+            cursor.execute(
+                f"CREATE TABLE IF NOT EXISTS {STATE_TABLE} "
+                f"(tbl VARCHAR(128) PRIMARY KEY, rate DOUBLE, last_key BIGINT)"
+            )
+            conn.commit()
+            for table, (rate, key) in _table_settings(approx_cfg).items():
+                with _refresh_lock(cursor, dialect, table):
+                    try:
+                        added[table] = _refresh_table(cursor, dialect, table, rate, key)
+                        conn.commit()
+                    except Exception:
+                        conn.rollback()
+                        raise
+        finally:
+            cursor.close()
+    return added
+
+
+# ── SQL 改写 ──
+
+def _match_paren(sql: str, open_pos: int) -> int:
+    """返回与 open_pos 处左括号匹配的右括号位置（跳过字符串字面量）。"""
+    depth, quote = 0, None
+    for i in range(open_pos, len(sql)):
+        ch = sql[i]
+        if quote:
+            if ch == quote:
+                quote = None
+        elif ch in ("'", '"', "`"):
+            quote = ch
+        elif ch == "(":
+            depth += 1
+        elif ch == ")":
+            depth -= 1
+            if depth == 0:
+                return i
+    raise ValueError("括号不匹配")
+
+
+def _split_top_level(text: str) -> list:
+    """按顶层逗号切分 select 列表。"""
+    parts, depth, quote, start = [], 0, None, 0
+    for i, ch in enumerate(text):
+        if quote:
+            if ch == quote:
+                quote = None
+        elif ch in ("'", '"', "`"):
+            quote = ch
+        elif ch == "(":
+            depth += 1
+        elif ch == ")":
+            depth -= 1
+        elif ch == "," and depth == 0:
+            parts.append(text[start:i])
+            start = i + 1
+    parts.append(text[start:])
+    return [p.strip() for p in parts]
+
+
+def _top_level_from(sql: str):
+    """返回顶层 FROM 的位置（跳过 EXTRACT(YEAR FROM x) 这类括号内的 FROM）。"""
+    depth = 0
+    for m in re.finditer(r"\(|\)|'[^']*'|\bFROM\b", sql, re.IGNORECASE):
+        token = m.group(0)
+        if token == "(":
+            depth += 1
+        elif token == ")":
+            depth -= 1
+        elif token.upper() == "FROM" and depth == 0:
+            return m.start()
+    return None
+
+
+def _aggregates(expr: str) -> list:
+    """返回表达式中的聚合调用 [(func, arg, start, end)]，end 为右括号之后的位置。"""
+    found = []
+    for m in _AGG_RE.finditer(expr):
+        close = _match_paren(expr, m.end() - 1)
+        found.append((m.group(1).upper(), expr[m.end():close].strip(), m.start(), close + 1))
+    return found
+
+
+def _scale_aggregates(expr: str, factor: float) -> str:
+    out, pos = [], 0
+    for func, arg, start, end in _aggregates(expr):
+        out.append(expr[pos:start])
+        call = expr[start:end]
+        out.append(f"({call} * {factor})" if func in ("COUNT", "SUM") else call)
+        pos = end
+    out.append(expr[pos:])
+    return "".join(out)
+
+
+def _on_nullable_side(sql: str, table: str) -> bool:
+    """抽样表是否在外连接可为空的一侧：未入样的行会变成 NULL 填充的行而不是消失，按比例放大不再成立。"""
+    ref = re.search(rf"\b(?:(LEFT|FULL)\s+(?:OUTER\s+)?)?(?:FROM|JOIN)\s+{re.escape(table)}\b", sql, re.IGNORECASE)
+    if ref.group(1):
+        return True
+    # 之后出现的 RIGHT / FULL JOIN 会让它左侧的所有表变为可为空的一侧
+    return re.search(r"\b(RIGHT|FULL)\s+(?:OUTER\s+)?JOIN\b", sql[ref.end():], re.IGNORECASE) is not None
+
+
+def _variance_expr(func: str, arg: str, rate: float) -> str:
+    """聚合估计值的方差估计（不开方，SQLite 不一定有 SQRT）。"""
+    k2 = 1 / rate / rate
+    if func == "COUNT":
+        return f"(COUNT({arg}) * {1 - rate} * {k2})"
+    if func == "SUM":
+        return f"(SUM(({arg}) * ({arg})) * {1 - rate} * {k2})"
+    # AVG：样本方差 / n，乘有限总体修正 (1 - rate)
+    return (f"((SUM(({arg}) * ({arg})) * 1.0 / COUNT({arg}) - AVG({arg}) * AVG({arg}))"
+            f" * {1 - rate} / COUNT({arg}))")
+
+
+def _split_alias(item: str):
+    """拆出 select 项的别名：支持 `expr AS name` 和 `func(...) name`，返回 (expr, alias 或 None)。"""
+    m = re.match(r"^(.*\S)\s+AS\s+([^\s()',.]+)$", item, re.IGNORECASE | re.DOTALL)
+    if m is None:
+        m = re.match(r"^(.*\))\s+([^\s()',.]+)$", item, re.DOTALL)
+    if m is None:
+        return item, None
+    return m.group(1).strip(), m.group(2)
+
+
+def rewrite_for_sample(sql: str, approx_cfg: dict, dialect: str = "SQLite"):
+    """把可近似的聚合查询改写为在抽样表上执行。
+
+    返回 (rewritten_sql, table, rate, n_items)，其中结果的前 n_items 列为原始列，
+    之后依次是各聚合列的方差列（__var_<列序号>）；不可改写时返回 None。
+    """
+    stripped = sql.strip().rstrip(";").strip()
+    if not re.match(r"^SELECT\b", stripped, re.IGNORECASE):
+        return None
+    if len(re.findall(r"\bSELECT\b", stripped, re.IGNORECASE)) != 1 or _UNSUPPORTED_RE.search(stripped):
+        return None
+    if not _AGG_RE.search(stripped):
+        return None
+
+    settings = _table_settings(approx_cfg)
+    hits = [t for t in settings if re.search(rf"\b(FROM|JOIN)\s+{re.escape(t)}\b", stripped, re.IGNORECASE)]
+    if len(hits) != 1:
+        return None
+    table = hits[0]
+    if len(re.findall(rf"\b{re.escape(table)}\b(?!\s*\.)", stripped, re.IGNORECASE)) != 1:
+        return None  # 自连接等多次引用
+    if _on_nullable_side(stripped, table):
+        return None
+    rate = settings[table][0]
+
+    from_pos = _top_level_from(stripped)
+    if from_pos is None:
+        return None
+    select_list = stripped[len("SELECT"):from_pos]
+    if re.match(r"^\s*DISTINCT\b", select_list, re.IGNORECASE):
+        return None
+    items = _split_top_level(select_list)
+    if any(item == "*" or item.endswith(".*") for item in items):
+        return None
+
+    factor = 1 / rate
+    new_items, var_items = [], []
+    for i, item in enumerate(items):
+        expr, alias = _split_alias(item)
+        aggs = _aggregates(expr)
+        new_expr = _scale_aggregates(expr, factor)
+        if alias is None and new_expr != expr:
+            # 保持与精确结果相同的列名
+            quote = '"' if dialect == "SQLite" else "`"
+            alias = f"{quote}{expr}{quote}"
+        new_items.append(f"{new_expr} AS {alias}" if alias else new_expr)
+        # 只有整列恰好是一个聚合调用时才给误差范围；SUM(x) / COUNT(*) 这类组合的方差不能只看其中一项
+        if len(aggs) == 1 and aggs[0][2] == 0 and aggs[0][3] == len(expr):
+            func, arg, _, _ = aggs[0]
+            var_items.append(f"{_variance_expr(func, arg, rate)} AS __var_{i}")
+
+    rest = stripped[from_pos:]
+    rest = re.sub(rf"\b(FROM|JOIN)(\s+){re.escape(table)}\b", rf"\1\2{SAMPLE_PREFIX}{table}", rest,
+                  count=1, flags=re.IGNORECASE)
+    m = re.search(rf"\b{SAMPLE_PREFIX}{re.escape(table)}\b(?:\s+(?:AS\s+)?(\w+))?", rest, re.IGNORECASE)
+    if m.group(1) is None or m.group(1).upper() in _CLAUSE_KEYWORDS:
+        # 原表没有别名时，列名前缀（orders.xxx）仍指向原表名，补一个同名别名
+        rest = rest[:m.start()] + f"{SAMPLE_PREFIX}{table} AS {table}" + rest[m.start() + len(SAMPLE_PREFIX + table):]
+    rewritten = "SELECT " + ", ".join(new_items + var_items) + " " + rest
+    return rewritten, table, rate, len(items)
+
+
+def _attach_error_bounds(df: pd.DataFrame, n_items: int) -> pd.DataFrame:
+    """把 __var_i 方差列换算为「<列名> ±95%」列，放在对应列后面。"""
+    out = df.iloc[:, :n_items].copy()
+    for col in df.columns[n_items:]:
+        i = int(col[len("__var_"):])
+        name = df.columns[i]
+        half = df[col].astype(float).clip(lower=0).map(lambda v: Z_95 * math.sqrt(v) if pd.notna(v) else v)
+        out.insert(out.columns.get_loc(name) + 1, f"{name} ±95%", half.round(2))
+    return out
+
+
+# ── 执行 ──
+
+class ApproxRunner:
+    """先返回抽样结果，精确结果在后台线程计算。
+
+    抽样表在后台线程中构建和刷新；首次构建完成前、或构建失败（如没有建表权限）时，run() 返回 None，
+    调用方直接执行精确查询。
+    """
+
+    def __init__(self, vn, approx_cfg: dict):
+        self.vn = vn
+        self.approx_cfg = approx_cfg
+        self.error = None
+        self._ready = threading.Event()
+        self._stopped = threading.Event()
+        # 每个近似查询都伴随一条后台精确查询，线程数与连接池一致，并发提问时精确结果不排队
+        self._executor = ThreadPoolExecutor(max_workers=vn.db_pool.size, thread_name_prefix="approx-exact")
+        self._thread = threading.Thread(target=self._refresh_loop, name="approx-refresh", daemon=True)
+        self._thread.start()
+
+    @property
+    def ready(self) -> bool:
+        return self._ready.is_set()
+
+    def _refresh_loop(self):
+        interval = self.approx_cfg.get("refresh_seconds", 600)
+        while not self._stopped.is_set():
+            try:
+                refresh_samples(self.vn, self.approx_cfg)
+                self.error = None
+                self._ready.set()
+            except Exception as e:
+                self.error = str(e)
+                print(f"抽样表刷新失败：{e}")
+            # 未配置刷新间隔时只构建一次；构建失败仍按默认间隔重试
+            if not interval and self._ready.is_set():
+                break
+            if self._stopped.wait(interval or 600):
+                break
+
+    def close(self):
+        """停止刷新线程，取消尚未开始的精确查询（实例被回收时调用）。"""
+        self._stopped.set()
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def run(self, sql: str):
+        """可近似时返回 (approx_df, info, exact_future)，否则返回 None。
+
+        抽样查询失败时 approx_df 为 None，调用方等待 exact_future 即可，不要再执行一次精确查询。
+        """
+        if not self._ready.is_set() or self._stopped.is_set():
+            return None
+        rewritten = rewrite_for_sample(sql, self.approx_cfg, getattr(self.vn, "dialect", "SQLite"))
+        if rewritten is None:
+            return None
+        sample_sql, table, rate, n_items = rewritten
+        exact = self._executor.submit(self.vn.run_sql, sql)
+        info = {"table": table, "rate": rate, "sql": sample_sql}
+        try:
+            df = _attach_error_bounds(self.vn.run_sql(sample_sql), n_items)
+        except Exception as e:
+            # 精确查询已经在执行，只等它的结果
+            return None, {**info, "error": str(e)}, exact
+        return df, info, exact
+
+
+_runners_lock = threading.Lock()
+
+
+def get_approx_runner(vn, cfg: dict):
+    """配置了 approx 时返回 vn 的 ApproxRunner（首次调用时在后台开始构建抽样表），否则返回 None。"""
+    approx_cfg = cfg.get("approx")
+    if not approx_cfg or not approx_cfg.get("tables"):
+        return None
+    with _runners_lock:
+        runner = getattr(vn, "approx_runner", None)
+        if runner is None:
+            runner = ApproxRunner(vn, approx_cfg)
+            vn.approx_runner = runner
+        return runner
@@ -0,0 +1,131 @@
+"""
+向量库基准测试：NumPy 后端 vs ChromaDB（构建时间、单次查询延迟、常驻内存）
+用法：
+    python bench_vector_store.py                    # 默认 1 万 / 5 万条
+    python bench_vector_store.py --sizes 100000 --queries 500
+
+使用随机的归一化向量（维度与默认 embedding 模型 all-MiniLM-L6-v2 一致），
+不加载 embedding 模型；每个后端在独立子进程中运行，保证内存数据互不干扰。
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+DIM = 384
+BATCH = 5000
+
+
+def _rss_mb() -> float:
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    # 非 Linux：退化为峰值内存（macOS 单位为字节）
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 1024 / (1024 if sys.platform == "darwin" else 1)
+
+
+def _data(n: int, queries: int):
+    rng = np.random.default_rng(0)
+    vectors = rng.standard_normal((n, DIM), dtype=np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    probes = rng.standard_normal((queries, DIM), dtype=np.float32)
+    probes /= np.linalg.norm(probes, axis=1, keepdims=True)
+    ids = [f"{i}-sql" for i in range(n)]
+    docs = [json.dumps({"question": f"q{i}", "sql": f"SELECT {i}"}) for i in range(n)]
+    return ids, docs, vectors, probes
+
+
+def _open_collection(backend: str, path: str):
+    if backend == "numpy":
+        from numpy_vector import NumpyCollection
+        os.makedirs(path, exist_ok=True)
+        return NumpyCollection(path, "sql", embedding_function=None)
+
+    import chromadb
+    from chromadb.config import Settings
+    client = chromadb.PersistentClient(path=path, settings=Settings(anonymized_telemetry=False))
+    return client.get_or_create_collection(name="sql", embedding_function=None)
+
+
+def run_backend(backend: str, n: int, queries: int, k: int) -> dict:
+    ids, docs, vectors, probes = _data(n, queries)
+    with tempfile.TemporaryDirectory() as path:
+        base_rss = _rss_mb()
+
+        start = time.perf_counter()
+        collection = _open_collection(backend, path)
+        for i in range(0, n, BATCH):
+            collection.add(ids=ids[i:i + BATCH], documents=docs[i:i + BATCH],
+                           embeddings=vectors[i:i + BATCH].tolist())
+        build = time.perf_counter() - start
+
+        # 重新打开，测量冷启动
+        del collection
+        start = time.perf_counter()
+        collection = _open_collection(backend, path)
+        collection.query(query_embeddings=[probes[0].tolist()], n_results=k)
+        reopen = time.perf_counter() - start
+
+        latencies = []
+        for probe in probes:
+            start = time.perf_counter()
+            collection.query(query_embeddings=[probe.tolist()], n_results=k)
+            latencies.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        collection.query(query_embeddings=probes.tolist(), n_results=k)
+        batched = time.perf_counter() - start
+
+        latencies = np.array(latencies) * 1000
+        return {
+            "backend": backend,
+            "n": n,
+            "build_s": round(build, 2),
+            "reopen_s": round(reopen, 3),
+            "p50_ms": round(float(np.percentile(latencies, 50)), 3),
+            "p95_ms": round(float(np.percentile(latencies, 95)), 3),
+            "batched_ms_per_query": round(batched * 1000 / queries, 3),
+            "rss_mb": round(_rss_mb() - base_rss, 1),
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="向量库基准测试")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 50000])
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--backends", nargs="+", default=["numpy", "chromadb"])
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(run_backend(args.child, args.sizes[0], args.queries, args.k)))
+        return
+
+    header = f"{'backend':<10}{'n':>8}{'build_s':>10}{'reopen_s':>10}{'p50_ms':>9}{'p95_ms':>9}{'batch_ms':>10}{'rss_mb':>9}"
+    print(header)
+    for n in args.sizes:
+        for backend in args.backends:
+            out = subprocess.run(
+                [sys.executable, __file__, "--child", backend, "--sizes", str(n),
+                 "--queries", str(args.queries), "--k", str(args.k)],
+                capture_output=True, text=True, check=True,
+            )
+            r = json.loads(out.stdout.strip().splitlines()[-1])
+            print(f"{r['backend']:<10}{r['n']:>8}{r['build_s']:>10}{r['reopen_s']:>10}"
+                  f"{r['p50_ms']:>9}{r['p95_ms']:>9}{r['batched_ms_per_query']:>10}{r['rss_mb']:>9}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,209 @@
+"""
+批量导入 question→SQL 对和业务文档（JSONL / CSV / YAML），导入前并行校验每条 SQL。
+
+文件格式（每条记录二选一）：
+    {"question": "...", "sql": "..."}
+    {"documentation": "..."}
+
+校验使用连接池并行执行：默认 EXPLAIN（不真正执行），--execute 时在只读事务中真正执行一次、只取第一行，
+执行后回滚；单条超时即判为失败。无法解析的行和未通过校验的条目写入报告，只有通过的条目会批量写入向量库。
+"""
+import csv
+import json
+import os
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import sqlparse
+from vanna.legacy.utils import deterministic_uuid
+
+from learning import add_question_sql_batch
+
+
+def _bad_record(line: int, raw, error: str) -> dict:
+    # 无法解析的行不中断导入，校验阶段直接判为失败并写入报告
+    return {"line": line, "raw": raw, "_parse_error": error}
+
+
+def _as_record(item, line: int) -> dict:
+    if not isinstance(item, dict):
+        return _bad_record(line, item, "记录必须是键值对（question/sql 或 documentation）")
+    return {**item, "line": line}
+
+
+def load_records(path: str) -> list:
+    """读取导入文件，返回记录列表（每条带 line 字段，便于报告定位）。"""
+    ext = os.path.splitext(path)[1].lower()
+    if ext in (".jsonl", ".ndjson"):
+        records = []
+        with open(path, "r", encoding="utf-8") as f:
+            for line_no, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+                try:
+                    item = json.loads(line)
+                except json.JSONDecodeError as e:
+                    records.append(_bad_record(line_no, line.rstrip("\n"), f"JSON 格式错误：{e}"))
+                    continue
+                records.append(_as_record(item, line_no))
+        return records
+
+    if ext == ".csv":
+        with open(path, "r", encoding="utf-8-sig", newline="") as f:
+            # 第 1 行是表头，数据从第 2 行开始
+            return [{**row, "line": line_no} for line_no, row in enumerate(csv.DictReader(f), 2)]
+
+    if ext in (".yaml", ".yml"):
+        import yaml
+        with open(path, "r", encoding="utf-8") as f:
+            data = yaml.safe_load(f) or []
+        if isinstance(data, dict):
+            data = list(data.get("pairs") or []) + [{"documentation": d} for d in data.get("documentation") or []]
+        if not isinstance(data, list):
+            raise ValueError("YAML 文件顶层应为列表，或包含 pairs / documentation 的字典")
+        return [_as_record(item, i) for i, item in enumerate(data, 1)]
+
+    raise ValueError(f"不支持的文件格式: {ext}（支持 .jsonl / .csv / .yaml）")
+
+
+def _check_statement(sql: str):
+    # 去掉注释：结尾的 -- 注释会让拼接后的语句不完整
+    stripped = sqlparse.format(sql, strip_comments=True).strip().rstrip(";").strip()
+    if not stripped:
+        raise ValueError("SQL 为空")
+    if len(sqlparse.split(stripped)) > 1:
+        raise ValueError("只允许单条语句")
+    # 按解析出的语句类型判断，前缀判断会放过 WITH ... DELETE 之类的写语句
+    if sqlparse.parse(stripped)[0].get_type() != "SELECT":
+        raise ValueError("只允许 SELECT / WITH 查询语句")
+    return stripped
+
+
+def validate_sql(vn, sql: str, execute: bool = False, timeout: float = 5.0):
+    """在 vn 的数据库上校验一条 SQL，失败时抛出异常。
+
+    execute 时真正执行语句但只取第一行：SQLite 按行惰性求值，MySQL 用 sql_select_limit 限制返回行数。
+    执行放在只读事务里并在结束后回滚（SQLite 用 query_only，MySQL 用 START TRANSACTION READ ONLY），
+    即使语句分类漏判也写不进数据库。
+    不包一层子查询，否则选出同名列的 JOIN 在 MySQL 上会报错（1060）。
+    """
+    stripped = _check_statement(sql)
+    dialect = getattr(vn, "dialect", "SQLite")
+    if execute:
+        statement = stripped
+    elif dialect == "SQLite":
+        statement = f"EXPLAIN QUERY PLAN {stripped}"
+    else:
+        statement = f"EXPLAIN {stripped}"
+
+    with vn.db_pool.connection() as conn:
+        cursor = conn.cursor()
+        try:
+            if isinstance(conn, sqlite3.Connection):
+                deadline = time.monotonic() + timeout
+                conn.set_progress_handler(lambda: time.monotonic() > deadline, 10000)
+                if execute:
+                    cursor.execute("PRAGMA query_only = ON")
+                try:
+                    cursor.execute(statement)
+                    cursor.fetchone() if execute else cursor.fetchall()
+                finally:
+                    conn.set_progress_handler(None, 0)
+                    if execute:
+                        conn.rollback()
+                        cursor.execute("PRAGMA query_only = OFF")
+            else:
+                # MySQL 5.7+：MAX_EXECUTION_TIME 只对 SELECT 生效，单位毫秒；不支持的版本（如 MariaDB）不限时
+                try:
+                    cursor.execute(f"SET SESSION MAX_EXECUTION_TIME = {int(timeout * 1000)}")
+                    limited = True
+                except Exception:
+                    limited = False
+                if execute:
+                    cursor.execute("SET SESSION sql_select_limit = 1")
+                    cursor.execute("START TRANSACTION READ ONLY")
+                try:
+                    cursor.execute(statement)
+                    cursor.fetchall()
+                finally:
+                    if execute:
+                        cursor.execute("ROLLBACK")
+                        cursor.execute("SET SESSION sql_select_limit = DEFAULT")
+                    if limited:
+                        cursor.execute("SET SESSION MAX_EXECUTION_TIME = 0")
+        finally:
+            cursor.close()
+
+
+def _validate_record(vn, record: dict, execute: bool, timeout: float):
+    """返回 (record, 错误信息或 None)。"""
+    if "_parse_error" in record:
+        return record, record["_parse_error"]
+    if record.get("documentation"):
+        if not isinstance(record["documentation"], str):
+            return record, "documentation 必须是字符串"
+        return record, None
+    question, sql = record.get("question") or "", record.get("sql") or ""
+    if not isinstance(question, str) or not isinstance(sql, str):
+        return record, "question 和 sql 必须是字符串"
+    if not question.strip() or not sql.strip():
+        return record, "缺少 question 或 sql"
+    try:
+        validate_sql(vn, sql, execute=execute, timeout=timeout)
+    except sqlite3.OperationalError as e:
+        return record, "执行超时" if "interrupted" in str(e) else str(e)
+    except Exception as e:
+        return record, str(e)
+    return record, None
+
+
+def bulk_import(vn, path: str, workers: int = None, execute: bool = False, timeout: float = 5.0,
+                report_path: str = None) -> dict:
+    """校验并导入文件中的记录，返回统计信息；失败条目写入 report_path（JSONL）。"""
+    records = load_records(path)
+    workers = workers or vn.db_pool.size
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        results = list(executor.map(lambda r: _validate_record(vn, r, execute, timeout), records))
+
+    rejected = [{**{k: v for k, v in record.items() if k != "_parse_error"}, "error": error}
+                for record, error in results if error]
+    valid = [record for record, error in results if not error]
+    pairs = [(r["question"].strip(), r["sql"].strip()) for r in valid if not r.get("documentation")]
+    docs = [r["documentation"].strip() for r in valid if r.get("documentation")]
+
+    added_pairs = add_question_sql_batch(vn, pairs)
+    added_docs = _add_documentation_batch(vn, docs)
+
+    if rejected:
+        report_path = report_path or os.path.splitext(path)[0] + ".rejected.jsonl"
+        with open(report_path, "w", encoding="utf-8") as f:
+            for row in rejected:
+                f.write(json.dumps(row, ensure_ascii=False) + "\n")
+
+    return {
+        "total": len(records),
+        "valid": len(valid),
+        "rejected": rejected,
+        "report_path": report_path if rejected else None,
+        "added_pairs": len(added_pairs),
+        "added_docs": added_docs,
+    }
+
+
+def _add_documentation_batch(vn, docs: list, batch_size: int = 256) -> int:
+    rows = {deterministic_uuid(doc) + "-doc": doc for doc in docs}
+    collection = vn.documentation_collection
+    ids = list(rows)
+    added = 0
+    for start in range(0, len(ids), batch_size):
+        chunk = ids[start:start + batch_size]
+        existing = set(collection.get(ids=chunk, include=[])["ids"])
+        new_ids = [id for id in chunk if id not in existing]
+        if not new_ids:
+            continue
+        documents = [rows[id] for id in new_ids]
+        collection.upsert(ids=new_ids, documents=documents, embeddings=vn.embedding_function(documents))
+        added += len(new_ids)
+    return added
@@ -0,0 +1,100 @@
+"""
+图表预处理：在服务端聚合/降采样，保证无论查询返回多少行，发送到浏览器的图表数据点数都有上限。
+
+- 时间序列 → 折线图，LTTB（Largest-Triangle-Three-Buckets）降采样
+- 分类数据 → 柱状图，按类别汇总后取 Top-N，其余合并为「其他」
+- 数值 x 轴 → 散点图，均匀抽样
+"""
+import warnings
+
+import numpy as np
+import pandas as pd
+
+MAX_CHART_POINTS = 500
+TOP_N_CATEGORIES = 20
+OTHER_LABEL = "其他"
+
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, threshold: int) -> np.ndarray:
+    """返回 LTTB 降采样后保留的行下标（x 需已升序）。"""
+    n = len(y)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    indices = np.empty(threshold, dtype=np.int64)
+    indices[0], indices[-1] = 0, n - 1
+    # 中间 n-2 个点均分到 threshold-2 个桶
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.int64)
+
+    a = 0
+    for i in range(threshold - 2):
+        start, end = edges[i], edges[i + 1]
+        # 下一个桶的均值作为三角形的第三个顶点
+        next_start, next_end = edges[i + 1], edges[i + 2] if i + 2 < len(edges) else n
+        avg_x = x[next_start:next_end].mean()
+        avg_y = y[next_start:next_end].mean()
+
+        area = np.abs(
+            (x[a] - avg_x) * (y[start:end] - y[a])
+            - (x[a] - x[start:end]) * (avg_y - y[a])
+        )
+        a = start + int(np.argmax(area))
+        indices[i + 1] = a
+
+    return indices
+
+
+def _as_datetime(s: pd.Series):
+    """能按日期解析的列返回 datetime Series，否则返回 None。"""
+    if pd.api.types.is_datetime64_any_dtype(s):
+        return s
+    if not (pd.api.types.is_object_dtype(s) or pd.api.types.is_string_dtype(s)):
+        return None
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", UserWarning)
+        # 先用少量取值试探，避免对大列逐行走 dateutil 解析
+        probe = pd.to_datetime(pd.Series(s.dropna().unique()[:100]), errors="coerce")
+        if probe.empty or probe.notna().mean() < 0.9:
+            return None
+        parsed = pd.to_datetime(s, errors="coerce")
+    if parsed.notna().mean() < 0.9:
+        return None
+    return parsed
+
+
+def prepare_chart(df: pd.DataFrame, max_points: int = MAX_CHART_POINTS, top_n: int = TOP_N_CATEGORIES):
+    """根据列类型选择图表并压缩数据。
+
+    返回 (chart_type, data)，chart_type 为 "line" / "bar" / "scatter"，
+    data 以 x 列为索引、只含一个数值列，行数不超过 max_points；不适合画图时返回 None。
+    """
+    if len(df.columns) < 2 or len(df) < 2:
+        return None
+    x_col = df.columns[0]
+    numeric_cols = [c for c in df.select_dtypes(include=["number"]).columns if c != x_col]
+    if not numeric_cols:
+        return None
+    y_col = numeric_cols[0]
+    data = df[[x_col, y_col]].dropna()
+    if data.empty:
+        return None
+
+    dates = _as_datetime(data[x_col])
+    if dates is not None:
+        data = data.assign(**{x_col: dates}).dropna().sort_values(x_col)
+        x = data[x_col].to_numpy(dtype="datetime64[ns]").astype(np.int64).astype(np.float64)
+        keep = lttb_indices(x, data[y_col].to_numpy(dtype=np.float64), max_points)
+        return "line", data.iloc[keep].set_index(x_col)[y_col]
+
+    if pd.api.types.is_numeric_dtype(data[x_col]):
+        if len(data) > max_points:
+            data = data.sample(n=max_points, random_state=0)
+        return "scatter", data.sort_values(x_col).set_index(x_col)[y_col]
+
+    totals = data.groupby(x_col, sort=False)[y_col].sum().sort_values(ascending=False)
+    top_n = min(top_n, max_points)
+    if len(totals) > top_n:
+        other = totals.iloc[top_n - 1:].sum()
+        totals = totals.iloc[:top_n - 1]
+        totals[OTHER_LABEL] = other
+    return "bar", totals
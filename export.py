@@ -0,0 +1,173 @@
+"""
+完整查询结果导出：重新执行 SQL，用服务端游标分块读取，边读边写 CSV / Parquet，内存占用与结果行数无关。
+
+- CSV：生成器逐块产出字节，可直接作为 HTTP 流式响应
+- Parquet：每块写成一个 row group 到文件（Parquet 的元数据在文件末尾，只能先落盘再下载）
+"""
+import csv
+import io
+import os
+import sqlite3
+import tempfile
+from contextlib import contextmanager
+
+EXPORT_CHUNK_ROWS = 10000
+EXPORT_FORMATS = ("csv", "parquet")
+
+
+@contextmanager
+def _server_cursor(vn, sql: str):
+    """从连接池取连接，返回已执行 sql 的游标。MySQL 使用 SSCursor，结果不会一次性读入客户端。"""
+    with vn.db_pool.connection() as conn:
+        if isinstance(conn, sqlite3.Connection):
+            cursor = conn.cursor()  # sqlite3 游标本身就是逐行读取
+        else:
+            import pymysql.cursors
+            cursor = conn.cursor(pymysql.cursors.SSCursor)
+        try:
+            cursor.execute(sql)
+            yield cursor
+        finally:
+            cursor.close()
+
+
+def iter_query_chunks(vn, sql: str, chunk_rows: int = EXPORT_CHUNK_ROWS):
+    """逐块产出 (columns, rows)，每块最多 chunk_rows 行；结果为空时产出一次 (columns, [])。"""
+    with _server_cursor(vn, sql) as cursor:
+        if cursor.description is None:
+            raise ValueError("该语句没有返回结果集")
+        columns = [desc[0] for desc in cursor.description]
+        empty = True
+        while True:
+            rows = cursor.fetchmany(chunk_rows)
+            if not rows:
+                break
+            empty = False
+            yield columns, rows
+        if empty:
+            yield columns, []
+
+
+def stream_csv(vn, sql: str, chunk_rows: int = EXPORT_CHUNK_ROWS):
+    """逐块产出 CSV 字节（UTF-8 带 BOM，Excel 打开中文不乱码）。"""
+    header_written = False
+    for columns, rows in iter_query_chunks(vn, sql, chunk_rows):
+        buf = io.StringIO()
+        writer = csv.writer(buf)
+        if not header_written:
+            buf.write("\ufeff")
+            writer.writerow(columns)
+            header_written = True
+        writer.writerows(rows)
+        yield buf.getvalue().encode("utf-8")
+
+
+def _infer_array(values):
+    import pyarrow as pa
+    try:
+        return pa.array(values)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        # 同一块里混有不兼容的 Python 类型（SQLite 动态类型），按字符串保存
+        return pa.array([None if v is None else str(v) for v in values], type=pa.string())
+
+
+def _widen_type(old, new):
+    """返回能同时无损容纳 old 和 new 两种值的类型（old 为 None 表示尚未确定）。"""
+    import pyarrow as pa
+    t = pa.types
+    if old is None or t.is_null(old):
+        old, new = new, None
+    if new is None or t.is_null(new) or new == old:
+        if t.is_integer(old):
+            return pa.int64()
+        if t.is_floating(old):
+            return pa.float64()
+        if t.is_decimal(old):
+            # 推断出的精度只够容纳这一块的值（如 decimal128(3, 2)），统一放宽到最大精度
+            return pa.decimal128(38, old.scale)
+        return old
+    if t.is_integer(old) and t.is_integer(new):
+        return pa.int64()
+    if (t.is_integer(old) or t.is_floating(old)) and (t.is_integer(new) or t.is_floating(new)):
+        return pa.float64()
+    if t.is_decimal(old) and t.is_decimal(new):
+        return pa.decimal128(38, max(old.scale, new.scale))
+    if t.is_decimal(old) and t.is_integer(new):
+        return pa.decimal128(38, old.scale)
+    if t.is_integer(old) and t.is_decimal(new):
+        return pa.decimal128(38, new.scale)
+    if t.is_decimal(old) and t.is_floating(new) or t.is_floating(old) and t.is_decimal(new):
+        return pa.float64()
+    return pa.string()
+
+
+def _reopen_writer(writer, current: str, path: str, schema):
+    """列类型放宽后，用新 schema 重新打开写入器，并把已写入的 row group 转换后复制过去。"""
+    import pyarrow.parquet as pq
+    if writer is None:
+        return pq.ParquetWriter(path, schema), path
+    writer.close()
+    target = path + ".widen" if current == path else path
+    writer = pq.ParquetWriter(target, schema)
+    written = pq.ParquetFile(current)
+    for i in range(written.num_row_groups):
+        writer.write_table(written.read_row_group(i).cast(schema, safe=True))
+    os.remove(current)
+    return writer, target
+
+
+def write_parquet(vn, sql: str, path: str, chunk_rows: int = EXPORT_CHUNK_ROWS) -> int:
+    """把查询结果分块写入 Parquet 文件（每块一个 row group），返回总行数。
+
+    列类型随数据放宽（整数 → 浮点、小数统一为 decimal128(38, scale)、不兼容时转为字符串），
+    所有转换都是无损的（safe cast）。类型变化时已写入的部分会按新类型重写一次，
+    每列最多发生几次，通常一次也不会发生。
+    """
+    import pyarrow as pa
+
+    writer = None
+    schema = None
+    current = path
+    total = 0
+    try:
+        for columns, rows in iter_query_chunks(vn, sql, chunk_rows):
+            arrays = [_infer_array(list(col)) for col in zip(*rows)] or [pa.array([])] * len(columns)
+            fields = [
+                pa.field(name, _widen_type(schema.field(i).type if schema else None, array.type))
+                for i, (name, array) in enumerate(zip(columns, arrays))
+            ]
+            new_schema = pa.schema(fields)
+            if writer is None or not new_schema.equals(schema):
+                schema = new_schema
+                writer, current = _reopen_writer(writer, current, path, schema)
+            writer.write_table(pa.Table.from_arrays(
+                [array.cast(field.type, safe=True) for array, field in zip(arrays, schema)], schema=schema,
+            ))
+            total += len(rows)
+    except (pa.ArrowInvalid, pa.ArrowNotImplementedError) as e:
+        raise ValueError(f"结果无法无损写入 Parquet（{e}），请改用 CSV 导出")
+    finally:
+        if writer is not None:
+            writer.close()
+        if current != path:
+            os.replace(current, path)
+    return total
+
+
+def export_to_file(vn, sql: str, fmt: str, directory: str = None) -> str:
+    """把完整结果导出为临时文件，返回文件路径（调用方负责删除）。"""
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"不支持的导出格式: {fmt}")
+    fd, path = tempfile.mkstemp(suffix=f".{fmt}", prefix="vanna_export_", dir=directory)
+    os.close(fd)
+    try:
+        if fmt == "csv":
+            with open(path, "wb") as f:
+                for chunk in stream_csv(vn, sql):
+                    f.write(chunk)
+        else:
+            write_parquet(vn, sql, path)
+    except Exception:
+        os.remove(path)
+        raise
+    return path
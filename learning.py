@@ -0,0 +1,196 @@
+"""
+后台学习队列：UI 中确认「答案正确」后把 question→SQL 对放入队列立即返回，
+由后台线程去重、批量计算 embedding 并写入 sql 集合，训练写入不再阻塞请求。
+
+待写入的条目先追加到本地日志（chromadb 目录下的 learning_journal.jsonl），
+写入成功后才从日志中移除；进程崩溃后再次启动队列时会重放日志中的条目。
+"""
+import atexit
+import json
+import os
+import threading
+import weakref
+
+from vanna.legacy.utils import deterministic_uuid
+
+JOURNAL_NAME = "learning_journal.jsonl"
+
+
+def question_sql_id(question: str, sql: str) -> tuple:
+    """返回 (id, document)，与 vanna 的 add_question_sql 保持一致，保证去重和幂等写入。"""
+    document = json.dumps({"question": question, "sql": sql}, ensure_ascii=False)
+    return deterministic_uuid(document) + "-sql", document
+
+
+def add_question_sql_batch(vn, pairs, batch_size: int = 256) -> list:
+    """批量写入 question→SQL 对：跳过已存在的条目，按批计算 embedding 后 upsert。
+
+    返回实际新增的 question 列表。
+    """
+    rows = {}
+    for question, sql in pairs:
+        id, document = question_sql_id(question, sql)
+        rows.setdefault(id, (document, question))
+
+    collection = vn.sql_collection
+    ids = list(rows)
+    added = []
+    for start in range(0, len(ids), batch_size):
+        chunk = ids[start:start + batch_size]
+        existing = set(collection.get(ids=chunk, include=[])["ids"])
+        new_ids = [id for id in chunk if id not in existing]
+        if not new_ids:
+            continue
+        documents = [rows[id][0] for id in new_ids]
+        collection.upsert(ids=new_ids, documents=documents, embeddings=vn.embedding_function(documents))
+        added.extend(rows[id][1] for id in new_ids)
+    return added
+
+
+class LearningQueue:
+    """question→SQL 对的后台批量写入队列。"""
+
+    def __init__(self, vn, journal_path: str, flush_interval: float = 5.0, batch_size: int = 64):
+        self.vn = vn
+        self.journal_path = journal_path
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self._listeners = []
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._pending = self._load_journal()
+
+        self._worker = threading.Thread(target=self._run, name="learning-queue", daemon=True)
+        self._worker.start()
+        if self._pending:
+            self._wakeup.set()
+
+    def add_listener(self, fn):
+        """注册写入成功后的回调 fn(questions)，用于失效按问题缓存的结果。"""
+        self._listeners.append(fn)
+
+    def submit(self, question: str, sql: str) -> str:
+        """记录一条已确认的 question→SQL 对并立即返回其 id。"""
+        question, sql = question.strip(), sql.strip()
+        if not question or not sql:
+            raise ValueError("question 和 sql 不能为空")
+        entry = {"question": question, "sql": sql}
+        with self._lock:
+            with open(self.journal_path, "a") as f:
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            self._pending.append(entry)
+            full = len(self._pending) >= self.batch_size
+        if full:
+            self._wakeup.set()
+        return question_sql_id(question, sql)[0]
+
+    def pending_count(self) -> int:
+        with self._lock:
+            return len(self._pending)
+
+    def flush(self) -> int:
+        """立即写入所有待处理条目，返回新增的条目数。"""
+        with self._flush_lock:
+            with self._lock:
+                batch = list(self._pending)
+            if not batch:
+                return 0
+
+            added = add_question_sql_batch(self.vn, [(e["question"], e["sql"]) for e in batch])
+
+            with self._lock:
+                del self._pending[:len(batch)]
+                self._rewrite_journal()
+
+            if added:
+                for fn in self._listeners:
+                    try:
+                        fn(added)
+                    except Exception as e:
+                        print(f"学习队列回调出错：{e}")
+            return len(added)
+
+    def close(self):
+        """停止后台线程并写入剩余条目。"""
+        _open_queues.discard(self)
+        self._stopped.set()
+        self._wakeup.set()
+        self._worker.join()
+        try:
+            self.flush()
+        except Exception as e:
+            # 条目仍在日志中，下次启动时重放
+            print(f"学习队列写入失败，剩余 {self.pending_count()} 条将在下次启动时写入：{e}")
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            if self._stopped.is_set():
+                break
+            try:
+                self.flush()
+            except Exception as e:
+                # 条目仍在日志中，下一轮重试
+                print(f"学习队列写入失败，稍后重试：{e}")
+
+    def _load_journal(self) -> list:
+        if not os.path.exists(self.journal_path):
+            return []
+        entries = []
+        good = 0  # 最后一条完整记录结束处的字节偏移
+        newline = True
+        with open(self.journal_path, "rb") as f:
+            for line in f:
+                try:
+                    entries.append(json.loads(line))
+                except (json.JSONDecodeError, UnicodeDecodeError):
+                    break
+                good += len(line)
+                newline = line.endswith(b"\n")
+        # 崩溃时写了一半的尾行必须截掉，否则之后 submit 追加的条目会接在残行后面，重启后丢失
+        if good < os.path.getsize(self.journal_path):
+            with open(self.journal_path, "r+b") as f:
+                f.truncate(good)
+        elif not newline:
+            with open(self.journal_path, "ab") as f:
+                f.write(b"\n")
+        return entries
+
+    def _rewrite_journal(self):
+        # 调用方需持有 self._lock
+        tmp_path = self.journal_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            for entry in self._pending:
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.journal_path)
+
+
+_queues_lock = threading.Lock()
+# 进程退出时关闭仍打开的队列；用弱引用，已回收的数据库实例（及其 vn）不会因此常驻内存
+_open_queues = weakref.WeakSet()
+
+
+@atexit.register
+def _close_open_queues():
+    for queue in list(_open_queues):
+        queue.close()
+
+
+def get_learning_queue(vn) -> LearningQueue:
+    """返回 vn 的学习队列，首次调用时创建（并重放日志中未写入的条目）。"""
+    with _queues_lock:
+        queue = getattr(vn, "learning_queue", None)
+        if queue is None:
+            journal_dir = vn.config.get("path", ".") if vn.config else "."
+            os.makedirs(journal_dir, exist_ok=True)
+            queue = LearningQueue(vn, os.path.join(journal_dir, JOURNAL_NAME))
+            vn.learning_queue = queue
+            _open_queues.add(queue)
+        return queue
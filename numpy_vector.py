@@ -0,0 +1,264 @@
+"""
+进程内 NumPy 向量库：ChromaDB 的轻量替代，适合几千到几十万条训练数据。
+
+每个集合在 <path>/numpy_index/ 下对应：
+    <name>.f32     # 归一化后的 float32 向量，按行连续存放，只追加，mmap 读取
+    <name>.jsonl   # 与向量行一一对应的 id / document / metadata，只追加；删除写墓碑记录
+    <name>.dim     # 向量维度
+
+检索是一次矩阵乘法 + argpartition 取 top-k（余弦相似度）。删除或覆盖留下的失效行超过一半时自动压缩文件。
+集合对象实现了 Chroma Collection 的常用子集（add / upsert / get / delete / query / count），
+因此 vanna 的 ChromaDB_VectorStore 方法、快照导入导出、学习队列都可以直接复用。
+"""
+import json
+import os
+import threading
+
+import numpy as np
+from vanna.legacy.base import VannaBase
+from vanna.legacy.chromadb.chromadb_vector import ChromaDB_VectorStore, default_ef
+
+COLLECTIONS = ("ddl", "sql", "documentation")
+
+
+def _as_list(value):
+    if value is None:
+        return None
+    if isinstance(value, (str, dict)):
+        return [value]
+    return list(value)
+
+
+class NumpyCollection:
+    """单个集合：内存中的 id 索引 + mmap 的向量矩阵。"""
+
+    def __init__(self, directory: str, name: str, embedding_function):
+        self.name = name
+        self.embedding_function = embedding_function
+        self._vec_path = os.path.join(directory, f"{name}.f32")
+        self._row_path = os.path.join(directory, f"{name}.jsonl")
+        self._dim_path = os.path.join(directory, f"{name}.dim")
+        self._lock = threading.RLock()
+        self._load()
+
+    # ── 存储 ──
+
+    def _load(self):
+        self.ids, self.documents, self.metadatas = [], [], []
+        self._row_of = {}
+        alive = []
+        for rec in self._read_rows():
+            if rec.get("deleted"):
+                row = self._row_of.pop(rec["id"], None)
+                if row is not None:
+                    alive[row] = False
+                continue
+            old = self._row_of.get(rec["id"])
+            if old is not None:
+                alive[old] = False
+            self._row_of[rec["id"]] = len(self.ids)
+            self.ids.append(rec["id"])
+            self.documents.append(rec.get("document"))
+            self.metadatas.append(rec.get("metadata"))
+            alive.append(True)
+        # _alive 是 _alive_buf 前 len(ids) 项的视图；缓冲区按倍数扩容，追加时不用整体重建
+        self._alive_buf = np.array(alive, dtype=bool)
+        self._alive = self._alive_buf
+        self._map_vectors()
+
+    def _grow_alive(self, extra: int):
+        n = len(self._alive)
+        if n + extra > len(self._alive_buf):
+            buf = np.zeros(max(n + extra, 2 * len(self._alive_buf), 64), dtype=bool)
+            buf[:n] = self._alive
+            self._alive_buf = buf
+        self._alive_buf[n:n + extra] = True
+        self._alive = self._alive_buf[:n + extra]
+
+    def _maybe_compact(self):
+        # 覆盖写入和删除都会留下失效行，超过一半时压缩
+        if len(self._row_of) * 2 < len(self.ids):
+            self._compact()
+
+    def _read_rows(self) -> list:
+        """读取记录日志；崩溃时写了一半的尾行会被截掉，否则之后追加的记录会接在残行后面、重新打开时全部丢失。"""
+        if not os.path.exists(self._row_path):
+            return []
+        records = []
+        good = 0  # 最后一条完整记录结束处的字节偏移
+        newline = True
+        with open(self._row_path, "rb") as f:
+            for line in f:
+                try:
+                    records.append(json.loads(line))
+                except (json.JSONDecodeError, UnicodeDecodeError):
+                    break
+                good += len(line)
+                newline = line.endswith(b"\n")
+        if good < os.path.getsize(self._row_path):
+            with open(self._row_path, "r+b") as f:
+                f.truncate(good)
+        elif not newline:
+            # 记录完整、只缺换行时补上
+            with open(self._row_path, "ab") as f:
+                f.write(b"\n")
+        return records
+
+    def _map_vectors(self):
+        n = len(self.ids)
+        self.dim = None
+        if os.path.exists(self._dim_path):
+            with open(self._dim_path, "r") as f:
+                self.dim = int(f.read())
+        if n == 0 or self.dim is None:
+            self._matrix = np.empty((0, self.dim or 0), dtype=np.float32)
+            return
+        # 向量文件可能比记录多出崩溃前写入的数据，截到与记录行数一致
+        if os.path.getsize(self._vec_path) > n * self.dim * 4:
+            with open(self._vec_path, "r+b") as f:
+                f.truncate(n * self.dim * 4)
+        self._matrix = np.memmap(self._vec_path, dtype=np.float32, mode="r", shape=(n, self.dim))
+
+    def _compact(self):
+        keep = np.flatnonzero(self._alive)
+        matrix = np.array(self._matrix[keep]) if len(keep) else np.empty((0, 0), dtype=np.float32)
+        tmp_vec, tmp_row = self._vec_path + ".tmp", self._row_path + ".tmp"
+        matrix.tofile(tmp_vec)
+        with open(tmp_row, "w") as f:
+            for row in keep:
+                f.write(json.dumps({"id": self.ids[row], "document": self.documents[row],
+                                    "metadata": self.metadatas[row]}, ensure_ascii=False) + "\n")
+        self._matrix = None
+        os.replace(tmp_vec, self._vec_path)
+        os.replace(tmp_row, self._row_path)
+        self._load()
+
+    # ── Chroma Collection 兼容接口 ──
+
+    def count(self) -> int:
+        return len(self._row_of)
+
+    def upsert(self, ids, documents=None, embeddings=None, metadatas=None, **kwargs):
+        ids = _as_list(ids)
+        documents = _as_list(documents) or [None] * len(ids)
+        metadatas = _as_list(metadatas) or [None] * len(ids)
+        if embeddings is None:
+            embeddings = self.embedding_function(documents)
+        vectors = np.asarray(embeddings, dtype=np.float32).reshape(len(ids), -1)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        vectors = vectors / np.where(norms == 0, 1, norms)
+
+        with self._lock:
+            if self.dim is not None and vectors.shape[1] != self.dim:
+                raise ValueError(f"向量维度 {vectors.shape[1]} 与集合 {self.name} 的维度 {self.dim} 不一致")
+            if self.dim is None:
+                with open(self._dim_path, "w") as f:
+                    f.write(str(vectors.shape[1]))
+            # 先写向量再写记录：崩溃时只会多出向量或残缺的尾行，加载时都会截掉；追加前再按行数截一次
+            with open(self._vec_path, "ab") as f:
+                f.truncate(len(self.ids) * vectors.shape[1] * 4)
+                vectors.tofile(f)
+            with open(self._row_path, "a") as f:
+                for id, doc, meta in zip(ids, documents, metadatas):
+                    f.write(json.dumps({"id": id, "document": doc, "metadata": meta}, ensure_ascii=False) + "\n")
+
+            self._grow_alive(len(ids))
+            for id, doc, meta in zip(ids, documents, metadatas):
+                old = self._row_of.get(id)
+                if old is not None:
+                    self._alive[old] = False
+                self._row_of[id] = len(self.ids)
+                self.ids.append(id)
+                self.documents.append(doc)
+                self.metadatas.append(meta)
+            # 维度已知，直接按新行数重新映射（mmap 只建立映射，与行数无关）
+            self.dim = vectors.shape[1]
+            self._matrix = np.memmap(self._vec_path, dtype=np.float32, mode="r", shape=(len(self.ids), self.dim))
+            self._maybe_compact()
+
+    add = upsert
+
+    def delete(self, ids=None, **kwargs):
+        ids = _as_list(ids) or []
+        with self._lock:
+            removed = [id for id in ids if id in self._row_of]
+            if not removed:
+                return
+            with open(self._row_path, "a") as f:
+                for id in removed:
+                    f.write(json.dumps({"id": id, "deleted": True}) + "\n")
+            for id in removed:
+                self._alive[self._row_of.pop(id)] = False
+            self._maybe_compact()
+
+    def get(self, ids=None, include=("documents", "metadatas"), **kwargs):
+        with self._lock:
+            if ids is None:
+                rows = np.flatnonzero(self._alive).tolist()
+            else:
+                rows = [self._row_of[id] for id in _as_list(ids) if id in self._row_of]
+            result = {"ids": [self.ids[r] for r in rows]}
+            if "documents" in include:
+                result["documents"] = [self.documents[r] for r in rows]
+            if "metadatas" in include:
+                result["metadatas"] = [self.metadatas[r] for r in rows]
+            if "embeddings" in include:
+                result["embeddings"] = np.array(self._matrix[rows]) if rows else np.empty((0, self.dim or 0), dtype=np.float32)
+            return result
+
+    def query(self, query_texts=None, query_embeddings=None, n_results=10, **kwargs):
+        """批量检索：返回与 Chroma 相同结构的 ids / documents / metadatas / distances（每个查询一组）。"""
+        if query_embeddings is None:
+            query_embeddings = self.embedding_function(_as_list(query_texts))
+        queries = np.asarray(query_embeddings, dtype=np.float32)
+        queries = queries.reshape(-1, queries.shape[-1])
+        queries = queries / np.maximum(np.linalg.norm(queries, axis=1, keepdims=True), 1e-12)
+
+        with self._lock:
+            result = {"ids": [], "documents": [], "metadatas": [], "distances": []}
+            k = min(n_results, self.count())
+            if k == 0:
+                for key in result:
+                    result[key] = [[] for _ in range(len(queries))]
+                return result
+
+            scores = queries @ self._matrix.T
+            scores[:, ~self._alive] = -np.inf
+            top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+            for qi, candidates in enumerate(top):
+                order = candidates[np.argsort(-scores[qi, candidates])]
+                result["ids"].append([self.ids[r] for r in order])
+                result["documents"].append([self.documents[r] for r in order])
+                result["metadatas"].append([self.metadatas[r] for r in order])
+                result["distances"].append((1 - scores[qi, order]).tolist())
+            return result
+
+
+class NumpyVectorStore(ChromaDB_VectorStore):
+    """与 ChromaDB_VectorStore 接口一致的向量库，检索由 NumpyCollection 完成。"""
+
+    def __init__(self, config=None):
+        VannaBase.__init__(self, config=config)
+        if config is None:
+            config = {}
+
+        self.embedding_function = config.get("embedding_function", default_ef)
+        self.n_results_sql = config.get("n_results_sql", config.get("n_results", 10))
+        self.n_results_documentation = config.get("n_results_documentation", config.get("n_results", 10))
+        self.n_results_ddl = config.get("n_results_ddl", config.get("n_results", 10))
+
+        self.index_dir = os.path.join(config.get("path", "."), "numpy_index")
+        os.makedirs(self.index_dir, exist_ok=True)
+        for name in COLLECTIONS:
+            setattr(self, f"{name}_collection", NumpyCollection(self.index_dir, name, self.embedding_function))
+
+    def remove_collection(self, collection_name: str) -> bool:
+        if collection_name not in COLLECTIONS:
+            return False
+        for suffix in (".f32", ".jsonl", ".dim"):
+            path = os.path.join(self.index_dir, collection_name + suffix)
+            if os.path.exists(path):
+                os.remove(path)
+        setattr(self, f"{collection_name}_collection",
+                NumpyCollection(self.index_dir, collection_name, self.embedding_function))
+        return True
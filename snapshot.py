@@ -0,0 +1,147 @@
+"""
+训练快照导出/导入：把 ddl / sql / documentation 三个集合连同向量一起打包，
+新节点直接批量导入，无需重新计算 embedding。
+
+快照是一个目录：
+    manifest.json          # 格式版本、embedding 模型签名、各集合条数
+    <collection>.npy       # float32 向量矩阵（可 mmap 读取）
+    <collection>.json      # ids / documents / metadatas（与矩阵行一一对应）
+"""
+import json
+import os
+
+import numpy as np
+
+SNAPSHOT_VERSION = 1
+COLLECTIONS = ("ddl", "sql", "documentation")
+IMPORT_BATCH_SIZE = 1000
+
+
+def _get_collection(vn, name: str):
+    return getattr(vn, f"{name}_collection")
+
+
+def _model_source(ef):
+    """返回真正提供模型信息的对象：chromadb 的 DefaultEmbeddingFunction 只是 ONNXMiniLM_L6_V2 的包装，name() 恒为 "default"。"""
+    if type(ef).__name__ == "DefaultEmbeddingFunction":
+        try:
+            from chromadb.utils.embedding_functions.onnx_mini_lm_l6_v2 import ONNXMiniLM_L6_V2
+            return ONNXMiniLM_L6_V2
+        except ImportError:
+            pass
+    return ef
+
+
+def embedding_signature(vn) -> dict:
+    """返回当前 embedding 模型的签名，用于校验快照与目标库是否兼容。"""
+    ef = vn.embedding_function
+    cls = type(ef)
+    source = _model_source(ef)
+    model = getattr(source, "MODEL_NAME", None) or getattr(source, "model_name", None)
+    if not model and callable(getattr(ef, "name", None)):
+        try:
+            model = ef.name()
+        except Exception:
+            model = None
+    signature = {
+        "class": f"{cls.__module__}.{cls.__name__}",
+        "model": model or "",
+    }
+    # ONNX 模型文件的校验和，同名模型换了权重也能发现
+    sha256 = getattr(source, "_MODEL_SHA256", None)
+    if sha256:
+        signature["model_sha256"] = sha256
+    return signature
+
+
+def export_snapshot(vn, out_dir: str) -> dict:
+    """导出全部训练数据（含向量）到 out_dir，返回 manifest。"""
+    os.makedirs(out_dir, exist_ok=True)
+    manifest = {
+        "version": SNAPSHOT_VERSION,
+        "embedding": embedding_signature(vn),
+        "dim": None,
+        "collections": {},
+    }
+
+    for name in COLLECTIONS:
+        data = _get_collection(vn, name).get(include=["embeddings", "documents", "metadatas"])
+        ids = list(data.get("ids") or [])
+        embeddings = data.get("embeddings")
+        matrix = np.asarray(embeddings if embeddings is not None else [], dtype=np.float32)
+        if not ids:
+            matrix = matrix.reshape(0, manifest["dim"] or 0)
+
+        if ids and manifest["dim"] is None:
+            manifest["dim"] = int(matrix.shape[1])
+        elif ids and matrix.shape[1] != manifest["dim"]:
+            raise ValueError(f"集合 {name} 的向量维度 {matrix.shape[1]} 与其他集合不一致")
+
+        np.save(os.path.join(out_dir, f"{name}.npy"), matrix)
+        with open(os.path.join(out_dir, f"{name}.json"), "w") as f:
+            json.dump({
+                "ids": ids,
+                "documents": list(data.get("documents") or []),
+                "metadatas": list(data.get("metadatas") or [None] * len(ids)),
+            }, f, ensure_ascii=False)
+        manifest["collections"][name] = len(ids)
+
+    with open(os.path.join(out_dir, "manifest.json"), "w") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    return manifest
+
+
+def load_manifest(snapshot_dir: str) -> dict:
+    path = os.path.join(snapshot_dir, "manifest.json")
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"不是有效的快照目录（缺少 manifest.json）: {snapshot_dir}")
+    with open(path, "r") as f:
+        manifest = json.load(f)
+    if manifest.get("version") != SNAPSHOT_VERSION:
+        raise ValueError(f"不支持的快照版本: {manifest.get('version')}")
+    return manifest
+
+
+def import_snapshot(vn, snapshot_dir: str, force: bool = False) -> dict:
+    """把快照批量写入 vn 的向量库，不调用 embedding 模型，返回 manifest。
+
+    默认要求快照的 embedding 签名与当前配置一致，否则检索结果没有意义；
+    force=True 时跳过签名校验，但向量维度必须一致。
+    """
+    manifest = load_manifest(snapshot_dir)
+    current = embedding_signature(vn)
+    if not force and manifest["embedding"] != current:
+        raise ValueError(
+            f"embedding 模型不一致：快照为 {manifest['embedding']}，当前为 {current}。"
+            "如确认兼容可使用 force=True。"
+        )
+    # 维度不一致时向量无法检索，force 也不能跳过
+    if manifest.get("dim") is not None:
+        dim = len(vn.generate_embedding("x"))
+        if dim != manifest["dim"]:
+            raise ValueError(f"向量维度不一致：快照为 {manifest['dim']}，当前 embedding 模型为 {dim}")
+
+    for name in COLLECTIONS:
+        if not manifest["collections"].get(name):
+            continue
+        matrix = np.load(os.path.join(snapshot_dir, f"{name}.npy"), mmap_mode="r")
+        with open(os.path.join(snapshot_dir, f"{name}.json"), "r") as f:
+            rows = json.load(f)
+        ids, documents, metadatas = rows["ids"], rows["documents"], rows["metadatas"]
+        if len(ids) != matrix.shape[0]:
+            raise ValueError(f"集合 {name} 的 ids 与向量行数不一致")
+
+        collection = _get_collection(vn, name)
+        for start in range(0, len(ids), IMPORT_BATCH_SIZE):
+            end = start + IMPORT_BATCH_SIZE
+            batch = {
+                "ids": ids[start:end],
+                "embeddings": np.asarray(matrix[start:end]).tolist(),
+                "documents": documents[start:end],
+            }
+            # Chroma 不接受全为 None 的 metadatas
+            if any(m for m in metadatas[start:end]):
+                batch["metadatas"] = metadatas[start:end]
+            collection.upsert(**batch)
+
+    return manifest
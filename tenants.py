@@ -0,0 +1,254 @@
+"""
+多数据库模式：一个进程按数据库 key 路由请求。
+
+config.json 示例：
+    {
+      "llm_type": "openai", "api_key": "sk-xxx",
+      "databases": {
+        "sales": {"db_type": "sqlite", "db_path": "sales.db"},
+        "hr":    {"db_type": "mysql", "db_host": "10.0.0.5", "db_name": "hr", ...}
+      },
+      "default_database": "sales",
+      "max_tenants": 8,
+      "tenant_idle_seconds": 1800
+    }
+
+每个数据库使用独立的 ChromaDB 目录（默认 chromadb_data/<key>）和独立的连接池；
+存活的 Vanna 实例放在 LRU 中，超过 max_tenants 或空闲超时即被回收，下次访问时再重建。
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from vanna_config import create_vanna
+
+DEFAULT_CHROMADB_ROOT = os.path.join(os.path.dirname(__file__), "chromadb_data")
+
+
+def tenant_config(cfg: dict, key: str) -> dict:
+    """合并全局配置与某个数据库的配置，得到可直接传给 create_vanna 的配置。"""
+    databases = cfg.get("databases", {})
+    if key not in databases:
+        raise KeyError(f"未配置的数据库: {key}")
+    # 全局的 chromadb_path 是各数据库目录的根目录，不能直接继承
+    merged = {k: v for k, v in cfg.items() if k not in ("databases", "default_database", "chromadb_path")}
+    merged.update(databases[key])
+    merged.setdefault("chromadb_path", os.path.join(cfg.get("chromadb_path", DEFAULT_CHROMADB_ROOT), key))
+    return merged
+
+
+def _close_vanna(vn):
+    readiness = getattr(vn, "readiness", None)
+    if readiness is not None:
+        readiness.cancel()
+
+    runner = getattr(vn, "approx_runner", None)
+    if runner is not None:
+        runner.close()
+
+    queue = getattr(vn, "learning_queue", None)
+    if queue is not None:
+        queue.close()
+
+    pool = getattr(vn, "db_pool", None)
+    if pool is not None:
+        pool.close()
+
+    # Chroma 按路径在进程内缓存 System，不主动释放的话回收实例并不会释放内存。
+    # 同一路径的客户端共用 System，close() 按引用计数在最后一个客户端关闭时才停止它
+    client = getattr(vn, "chroma_client", None)
+    if client is not None and hasattr(client, "close"):
+        try:
+            client.close()
+        except Exception:
+            pass
+
+
+class TenantPool:
+    """按数据库 key 懒加载 Vanna 实例，LRU + 空闲超时回收。
+
+    使用实例期间应通过 lease() / acquire() 租用：被回收的实例会等所有租用方归还后再关闭，
+    关闭在后台线程进行，不占用池的锁。
+    """
+
+    def __init__(self, cfg: dict, max_tenants: int = None, idle_seconds: float = None, factory=create_vanna):
+        if not cfg.get("databases"):
+            raise ValueError("多数据库模式需要在配置中提供 databases")
+        self.cfg = cfg
+        self.max_tenants = max_tenants or cfg.get("max_tenants", 8)
+        self.idle_seconds = idle_seconds if idle_seconds is not None else cfg.get("tenant_idle_seconds", 1800)
+        self.factory = factory
+        self._lock = threading.Lock()
+        self._key_locks = {}
+        self._live = OrderedDict()  # key -> (vn, last_used)
+        self._leases = {}  # id(vn) -> 租用计数
+        self._retired = {}  # id(vn) -> (key, vn)，已移出 LRU、等待租用方归还的实例
+
+    @property
+    def keys(self) -> list:
+        return list(self.cfg["databases"])
+
+    @property
+    def default_key(self) -> str:
+        return self.cfg.get("default_database") or self.keys[0]
+
+    def live_keys(self) -> list:
+        with self._lock:
+            return list(self._live)
+
+    def get(self, key: str = None):
+        """返回 key 对应的 Vanna 实例（不租用），必要时创建。只用于读取状态，长时间使用请用 lease()。"""
+        return self._get(key, lease=False)
+
+    def acquire(self, key: str = None):
+        """租用 key 对应的 Vanna 实例，用完后必须调用 release()。"""
+        return self._get(key, lease=True)
+
+    def release(self, vn):
+        with self._lock:
+            count = self._leases.pop(id(vn), 0) - 1
+            if count > 0:
+                self._leases[id(vn)] = count
+                return
+            retired = self._retired.pop(id(vn), None)
+        if retired is not None:
+            self._close_later([retired])
+
+    @contextmanager
+    def lease(self, key: str = None):
+        vn = self.acquire(key)
+        try:
+            yield vn
+        finally:
+            self.release(vn)
+
+    def _get(self, key: str, lease: bool):
+        key = key or self.default_key
+        # 先校验再取锁，未配置的 key 不会进入 _key_locks
+        if key not in self.cfg["databases"]:
+            raise KeyError(f"未配置的数据库: {key}")
+        with self._lock:
+            evicted = self._evict_idle()
+            entry = self._live.pop(key, None)
+            if entry is not None:
+                self._live[key] = (entry[0], time.monotonic())
+                if lease:
+                    self._lease(entry[0])
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+        self._close_later(evicted)
+        if entry is not None:
+            return entry[0]
+
+        # 同一 key 只创建一次；不同 key 的创建互不阻塞
+        with key_lock:
+            with self._lock:
+                if key in self._live:
+                    vn = self._live[key][0]
+                    if lease:
+                        self._lease(vn)
+                    return vn
+            vn = self.factory(tenant_config(self.cfg, key))
+            with self._lock:
+                self._live[key] = (vn, time.monotonic())
+                if lease:
+                    self._lease(vn)
+                evicted = []
+                while len(self._live) > self.max_tenants:
+                    old_key, (old, _) = self._live.popitem(last=False)
+                    evicted += self._retire(old_key, old)
+        self._close_later(evicted)
+        return vn
+
+    def evict(self, key: str) -> bool:
+        with self._lock:
+            entry = self._live.pop(key, None)
+            evicted = self._retire(key, entry[0]) if entry is not None else []
+        self._close_later(evicted)
+        return entry is not None
+
+    def close(self):
+        """关闭所有实例（进程退出时调用），不等待租用方归还。"""
+        with self._lock:
+            entries = [(key, vn) for key, (vn, _) in self._live.items()] + list(self._retired.values())
+            self._live.clear()
+            self._retired.clear()
+            self._leases.clear()
+        for key, vn in entries:
+            self._close(key, vn)
+
+    def _lease(self, vn):
+        # 调用方需持有 self._lock
+        self._leases[id(vn)] = self._leases.get(id(vn), 0) + 1
+
+    def _retire(self, key: str, vn) -> list:
+        """调用方需持有 self._lock。没有租用方时返回 [(key, vn)] 交给调用方关闭，否则等最后一个租用方归还。"""
+        if self._leases.get(id(vn)):
+            self._retired[id(vn)] = (key, vn)
+            return []
+        return [(key, vn)]
+
+    def _evict_idle(self) -> list:
+        # 调用方需持有 self._lock
+        if not self.idle_seconds:
+            return []
+        deadline = time.monotonic() - self.idle_seconds
+        evicted = []
+        for key in [k for k, (_, used) in self._live.items() if used < deadline]:
+            vn, _ = self._live.pop(key)
+            evicted += self._retire(key, vn)
+        return evicted
+
+    def _close_later(self, entries: list):
+        # 关闭时要写入学习队列的剩余条目，放到后台线程，不阻塞触发回收的请求
+        if entries:
+            threading.Thread(
+                target=lambda: [self._close(key, vn) for key, vn in entries], name="tenant-close", daemon=True
+            ).start()
+
+    def _close(self, key: str, vn):
+        # 持有 key 锁：关闭与同一 key 的新建互斥，避免新实例拿到正在停止的 Chroma System
+        with self._key_locks.setdefault(key, threading.Lock()):
+            _close_vanna(vn)
+
+
+class TenantRouter:
+    """把属性访问转发给当前请求对应的 Vanna 实例，供只接受单个 vn 的组件（如 VannaFlaskApp）使用。
+
+    key_func() 返回当前请求的数据库 key；对 router 设置的属性（如 VannaFlaskApp 的 vn.log）
+    会同时应用到之后取出的每个实例上。提供 store_func 时（返回 flask.g 之类的请求级对象，
+    无请求时返回 None），每个请求只租用一次实例，请求结束时需调用 release(store) 归还。
+    """
+
+    def __init__(self, pool: TenantPool, key_func, store_func=None):
+        object.__setattr__(self, "_pool", pool)
+        object.__setattr__(self, "_key_func", key_func)
+        object.__setattr__(self, "_store_func", store_func)
+        object.__setattr__(self, "_overrides", {})
+
+    def _current(self):
+        store = self._store_func() if self._store_func else None
+        if store is None:
+            vn = self._pool.get(self._key_func())
+        else:
+            vn = getattr(store, "tenant_vn", None)
+            if vn is None:
+                vn = self._pool.acquire(self._key_func())
+                store.tenant_vn = vn
+        for name, value in self._overrides.items():
+            if getattr(vn, name, None) is not value:
+                setattr(vn, name, value)
+        return vn
+
+    def release(self, store):
+        vn = getattr(store, "tenant_vn", None)
+        if vn is not None:
+            delattr(store, "tenant_vn")
+            self._pool.release(vn)
+
+    def __getattr__(self, name):
+        return getattr(self._current(), name)
+
+    def __setattr__(self, name, value):
+        self._overrides[name] = value
@@ -0,0 +1,84 @@
+"""
+approx.rewrite_for_sample 的改写规则：哪些查询可以近似、误差列只给单个聚合调用。
+
+运行：python -m pytest test_approx.py
+"""
+import sqlite3
+
+import pandas as pd
+import pytest
+
+from approx import _attach_error_bounds, rewrite_for_sample
+
+CFG = {"tables": {"orders": 0.1}}
+
+
+def _rewrite(sql):
+    return rewrite_for_sample(sql, CFG)
+
+
+def test_count_is_scaled_with_bound():
+    sql, table, rate, n_items = _rewrite("SELECT COUNT(*) FROM orders WHERE status = 'done'")
+    assert (table, rate, n_items) == ("orders", 0.1, 1)
+    assert "FROM _approx_orders AS orders" in sql
+    assert "(COUNT(*) * 10.0) AS \"COUNT(*)\"" in sql
+    assert "AS __var_0" in sql
+
+
+def test_bound_for_aliased_aggregate():
+    sql, _, _, n_items = _rewrite("SELECT status, SUM(amount) AS total, AVG(amount) avg_amount FROM orders GROUP BY status")
+    assert n_items == 3
+    assert "(SUM(amount) * 10.0) AS total" in sql
+    assert "__var_0" not in sql
+    assert "AS __var_1" in sql and "AS __var_2" in sql
+
+
+@pytest.mark.parametrize("item", ["SUM(amount) / COUNT(*)", "COUNT(*) + 1", "ROUND(AVG(amount), 2)"])
+def test_no_bound_for_composite_expression(item):
+    sql, _, _, n_items = _rewrite(f"SELECT {item} AS v FROM orders")
+    assert n_items == 1
+    assert "__var_" not in sql
+
+
+@pytest.mark.parametrize("sql", [
+    "SELECT COUNT(DISTINCT customer_id) FROM orders",
+    "SELECT SUM(DISTINCT amount) FROM orders",
+    "SELECT AVG( DISTINCT amount) FROM orders",
+    "SELECT MAX(amount) FROM orders",
+    "SELECT status, COUNT(*) FROM orders GROUP BY status HAVING COUNT(*) > 1",
+    "SELECT COUNT(*) FROM orders WHERE id IN (SELECT order_id FROM refunds)",
+    "SELECT COUNT(*) FROM customers",
+    "SELECT * FROM orders",
+])
+def test_unsupported_queries_are_not_rewritten(sql):
+    assert _rewrite(sql) is None
+
+
+@pytest.mark.parametrize("sql", [
+    "SELECT c.name, COUNT(o.id) FROM customers c LEFT JOIN orders o ON o.customer_id = c.id GROUP BY c.name",
+    "SELECT COUNT(*) FROM customers c LEFT OUTER JOIN orders o ON o.customer_id = c.id",
+    "SELECT COUNT(*) FROM orders o RIGHT JOIN customers c ON o.customer_id = c.id",
+    "SELECT COUNT(*) FROM customers c FULL JOIN orders o ON o.customer_id = c.id",
+])
+def test_sample_on_nullable_side_is_not_rewritten(sql):
+    assert _rewrite(sql) is None
+
+
+def test_sample_on_preserved_side_of_left_join():
+    sql, _, _, _ = _rewrite("SELECT COUNT(*) FROM orders o LEFT JOIN customers c ON o.customer_id = c.id")
+    assert "FROM _approx_orders o LEFT JOIN customers c" in sql
+
+
+def test_rewritten_sql_runs_on_sample_table():
+    conn = sqlite3.connect(":memory:")
+    conn.execute("CREATE TABLE _approx_orders (id INTEGER, status TEXT, amount REAL)")
+    conn.executemany("INSERT INTO _approx_orders VALUES (?, ?, ?)",
+                     [(1, "done", 10.0), (2, "done", 30.0), (3, "open", 5.0)])
+    sql, _, _, n_items = _rewrite("SELECT status, COUNT(*) AS n, SUM(amount) * 1.0 / COUNT(*) AS mean "
+                                  "FROM orders GROUP BY status ORDER BY status")
+    cursor = conn.execute(sql)
+    columns = [d[0] for d in cursor.description]
+    df = _attach_error_bounds(pd.DataFrame(cursor.fetchall(), columns=columns), n_items)
+    assert list(df.columns) == ["status", "n", "n ±95%", "mean"]
+    assert df["n"].tolist() == [20.0, 10.0]
+    assert df["mean"].tolist() == [20.0, 5.0]
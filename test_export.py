@@ -0,0 +1,75 @@
+"""
+export.write_parquet 的类型推断：列类型由各块数据共同决定，跨块变化时不能丢数据。
+
+运行：python -m pytest test_export.py
+"""
+import sqlite3
+from decimal import Decimal
+from types import SimpleNamespace
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+
+from export import write_parquet
+from vanna_config import ConnectionPool
+
+sqlite3.register_converter("DECIMAL", lambda raw: Decimal(raw.decode()))
+
+
+@pytest.fixture
+def make_vn(tmp_path):
+    def make(ddl: str, rows: list):
+        db_path = str(tmp_path / "t.db")
+        conn = sqlite3.connect(db_path)
+        conn.execute(ddl)
+        conn.executemany(f"INSERT INTO t VALUES ({', '.join('?' * len(rows[0]))})", rows)
+        conn.commit()
+        conn.close()
+        connect = lambda: sqlite3.connect(db_path, check_same_thread=False, detect_types=sqlite3.PARSE_DECLTYPES)
+        return SimpleNamespace(db_pool=ConnectionPool(connect))
+    return make
+
+
+def _export(vn, tmp_path, sql="SELECT * FROM t ORDER BY rowid"):
+    path = str(tmp_path / "out.parquet")
+    total = write_parquet(vn, sql, path, chunk_rows=1)
+    return total, pq.read_table(path)
+
+
+def test_int_then_float_widens_to_float(make_vn, tmp_path):
+    vn = make_vn("CREATE TABLE t (amount NUMERIC)", [(10,), (10.5,), (7,)])
+    total, table = _export(vn, tmp_path)
+    assert total == 3
+    assert table.schema.field("amount").type == pa.float64()
+    assert table.column("amount").to_pylist() == [10.0, 10.5, 7.0]
+
+
+def test_decimal_scale_and_precision_widen(make_vn, tmp_path):
+    vn = make_vn("CREATE TABLE t (amount DECIMAL)", [("1.5",), ("12345.25",), ("3",)])
+    _, table = _export(vn, tmp_path)
+    assert table.schema.field("amount").type == pa.decimal128(38, 2)
+    assert table.column("amount").to_pylist() == [Decimal("1.50"), Decimal("12345.25"), Decimal("3.00")]
+
+
+def test_leading_nulls_take_type_of_later_chunks(make_vn, tmp_path):
+    vn = make_vn("CREATE TABLE t (id INTEGER, note TEXT)", [(None, None), (1, None), (2, "x")])
+    _, table = _export(vn, tmp_path)
+    assert table.schema.field("id").type == pa.int64()
+    assert table.column("id").to_pylist() == [None, 1, 2]
+    assert table.column("note").to_pylist() == [None, None, "x"]
+
+
+def test_incompatible_types_fall_back_to_string(make_vn, tmp_path):
+    vn = make_vn("CREATE TABLE t (code)", [(1,), ("A-2",), (3.5,)])
+    _, table = _export(vn, tmp_path)
+    assert table.schema.field("code").type == pa.string()
+    assert table.column("code").to_pylist() == ["1", "A-2", "3.5"]
+
+
+def test_empty_result(make_vn, tmp_path):
+    vn = make_vn("CREATE TABLE t (id INTEGER)", [(1,)])
+    total, table = _export(vn, tmp_path, "SELECT * FROM t WHERE id > 1")
+    assert total == 0
+    assert table.column_names == ["id"]
+    assert table.num_rows == 0
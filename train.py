@@ -6,10 +6,18 @@ Vanna 训练脚本：导入 DDL schema、业务文档、Question→SQL 示例对
     python train.py --reset               # 清空训练数据后重新训练
     python train.py --add-pair            # 交互式追加 question→SQL 对
     python train.py --add-doc             # 交互式追加业务文档
+    python train.py --export snapshot/    # 导出训练快照（含向量）
+    python train.py --import snapshot/    # 从快照批量导入，不重新计算 embedding
+    python train.py --bulk pairs.jsonl   # 批量导入 Q&A 对/文档（JSONL/CSV/YAML），先并行校验 SQL
+    python train.py --db sales --auto     # 多数据库模式下训练指定数据库
 """
 import argparse
 import sys
 
+from approx import SAMPLE_PREFIX
+from bulk_import import bulk_import
+from snapshot import export_snapshot, import_snapshot
+from tenants import tenant_config
 from vanna_config import create_vanna, load_config
 
 
@@ -125,14 +133,19 @@ QUESTION_SQL_PAIRS = [
 ]
 
 
+def reset_collections(vn):
+    """清空 ddl / sql / documentation 三个集合。"""
+    print("清空已有训练数据...")
+    vn.remove_collection("ddl")
+    vn.remove_collection("sql")
+    vn.remove_collection("documentation")
+    print("已清空。\n")
+
+
 def train_all(vn, reset=False):
     """执行全量训练。"""
     if reset:
-        print("清空已有训练数据...")
-        vn.remove_collection("ddl")
-        vn.remove_collection("sql")
-        vn.remove_collection("documentation")
-        print("已清空。\n")
+        reset_collections(vn)
 
     # 1. 训练 DDL
     print("=== 训练 DDL（表结构）===")
@@ -161,11 +174,7 @@ def train_auto(vn, cfg, reset=False):
     db_type = cfg.get("db_type", "sqlite")
 
     if reset:
-        print("清空已有训练数据...")
-        vn.remove_collection("ddl")
-        vn.remove_collection("sql")
-        vn.remove_collection("documentation")
-        print("已清空。\n")
+        reset_collections(vn)
 
     # 1. 自动提取 DDL
     print("=== 从数据库自动提取表结构 ===")
@@ -178,7 +187,7 @@ def train_auto(vn, cfg, reset=False):
         cursor = conn.cursor()
         cursor.execute("SELECT name, sql FROM sqlite_master WHERE type='table' AND name NOT LIKE 'sqlite_%'")
         for table_name, create_sql in cursor.fetchall():
-            if create_sql:
+            if create_sql and not table_name.startswith(SAMPLE_PREFIX):
                 ddl_list.append((table_name, create_sql))
         conn.close()
 
@@ -196,7 +205,7 @@ def train_auto(vn, cfg, reset=False):
 
         # 获取所有表名
         cursor.execute("SHOW TABLES")
-        tables = [row[0] for row in cursor.fetchall()]
+        tables = [row[0] for row in cursor.fetchall() if not row[0].startswith(SAMPLE_PREFIX)]
 
         for table_name in tables:
             # 获取建表语句（包含字段注释）
@@ -253,6 +262,37 @@ def add_doc_interactive(vn):
         print(f"  + 已添加\n")
 
 
+def export_snapshot_cli(vn, out_dir):
+    """导出训练快照。"""
+    manifest = export_snapshot(vn, out_dir)
+    print(f"=== 已导出快照到 {out_dir} ===")
+    for name, count in manifest["collections"].items():
+        print(f"  {name}: {count} 条")
+    print(f"  embedding: {manifest['embedding']['class']} {manifest['embedding']['model']}")
+
+
+def import_snapshot_cli(vn, snapshot_dir, reset=False, force=False):
+    """从快照导入训练数据。"""
+    if reset:
+        reset_collections(vn)
+    manifest = import_snapshot(vn, snapshot_dir, force=force)
+    print(f"=== 已从 {snapshot_dir} 导入快照 ===")
+    for name, count in manifest["collections"].items():
+        print(f"  + {name}: {count} 条")
+
+
+def bulk_import_cli(vn, path, workers=None, execute=False, timeout=5.0):
+    """批量导入 question→SQL 对和业务文档。"""
+    print(f"=== 校验并导入 {path} ===")
+    result = bulk_import(vn, path, workers=workers, execute=execute, timeout=timeout)
+    print(f"  共 {result['total']} 条，校验通过 {result['valid']} 条，未通过 {len(result['rejected'])} 条")
+    for row in result["rejected"][:10]:
+        print(f"  - 第 {row['line']} 条: {row['error']}")
+    if result["report_path"]:
+        print(f"  未通过的条目已写入 {result['report_path']}")
+    print(f"  新增 Q&A 对 {result['added_pairs']} 个，新增文档 {result['added_docs']} 条（已存在的自动跳过）")
+
+
 def show_training_data(vn):
     """展示当前训练数据统计。"""
     df = vn.get_training_data()
@@ -273,6 +313,14 @@ def main():
     parser.add_argument("--add-pair", action="store_true", help="交互式追加 question→SQL 对")
     parser.add_argument("--add-doc", action="store_true", help="交互式追加业务文档")
     parser.add_argument("--show", action="store_true", help="展示当前训练数据统计")
+    parser.add_argument("--export", metavar="DIR", help="导出训练快照（含向量）到目录")
+    parser.add_argument("--import", dest="import_dir", metavar="DIR", help="从快照目录批量导入训练数据")
+    parser.add_argument("--bulk", metavar="FILE", help="从 JSONL/CSV/YAML 文件批量导入 Q&A 对和文档")
+    parser.add_argument("--workers", type=int, help="批量导入时并行校验 SQL 的线程数（默认等于连接池大小）")
+    parser.add_argument("--execute", action="store_true", help="批量导入时实际执行 SQL 校验（只取第一行）（默认 EXPLAIN）")
+    parser.add_argument("--timeout", type=float, default=5.0, help="单条 SQL 校验超时秒数")
+    parser.add_argument("--db", metavar="KEY", help="多数据库模式下要训练的数据库 key（默认 default_database）")
+    parser.add_argument("--force", action="store_true", help="导入快照时跳过 embedding 模型校验")
     args = parser.parse_args()
 
     cfg = load_config()
@@ -280,6 +328,11 @@ def main():
         print("请先创建 config.json，或通过 Streamlit 界面配置。")
         sys.exit(1)
 
+    if cfg.get("databases"):
+        db_key = args.db or cfg.get("default_database") or next(iter(cfg["databases"]))
+        cfg = tenant_config(cfg, db_key)
+        print(f"多数据库模式，当前训练数据库: {db_key}\n")
+
     # 训练只需 ChromaDB 本地 embedding，不需要 LLM API Key
     # 设置占位 key 避免 OpenAI 客户端初始化报错
     if not cfg.get("api_key") and cfg.get("llm_type", "openai") != "ollama":
@@ -293,6 +346,14 @@ def main():
         add_pair_interactive(vn)
     elif args.add_doc:
         add_doc_interactive(vn)
+    elif args.bulk:
+        bulk_import_cli(vn, args.bulk, workers=args.workers, execute=args.execute, timeout=args.timeout)
+        show_training_data(vn)
+    elif args.export:
+        export_snapshot_cli(vn, args.export)
+    elif args.import_dir:
+        import_snapshot_cli(vn, args.import_dir, reset=args.reset, force=args.force)
+        show_training_data(vn)
     elif args.auto:
         train_auto(vn, cfg, reset=args.reset)
         show_training_data(vn)
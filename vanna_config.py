@@ -3,14 +3,19 @@ Vanna 配置层：支持多种 LLM 后端 + ChromaDB + SQLite/MySQL
 """
 import json
 import os
+import queue
 import re
+from contextlib import contextmanager
 
+import pandas as pd
 from openai import OpenAI
 from vanna.legacy.chromadb.chromadb_vector import ChromaDB_VectorStore
 from vanna.legacy.openai.openai_chat import OpenAI_Chat
 from vanna.legacy.ollama.ollama import Ollama
 from vanna.legacy.anthropic.anthropic_chat import Anthropic_Chat
 
+from numpy_vector import NumpyVectorStore
+
 
 def _clean_llm_response(raw_sql: str) -> str:
     """清理 LLM 返回中的思考过程和 markdown 标记。"""
@@ -54,6 +59,48 @@ class Claude_Vanna(ChromaDB_VectorStore, Anthropic_Chat):
         return _clean_llm_response(raw)
 
 
+# ── NumPy 向量库版本（vector_store = "numpy"）──
+
+class OpenAI_NumpyVanna(NumpyVectorStore, OpenAI_Chat):
+    def __init__(self, config=None):
+        NumpyVectorStore.__init__(self, config=config)
+        OpenAI_Chat.__init__(self, config=config)
+
+    def submit_prompt(self, prompt, **kwargs) -> str:
+        raw = super().submit_prompt(prompt, **kwargs)
+        return _clean_llm_response(raw)
+
+
+class Ollama_NumpyVanna(NumpyVectorStore, Ollama):
+    def __init__(self, config=None):
+        NumpyVectorStore.__init__(self, config=config)
+        Ollama.__init__(self, config=config)
+
+    def submit_prompt(self, prompt, **kwargs) -> str:
+        raw = super().submit_prompt(prompt, **kwargs)
+        return _clean_llm_response(raw)
+
+
+class Claude_NumpyVanna(NumpyVectorStore, Anthropic_Chat):
+    def __init__(self, config=None):
+        NumpyVectorStore.__init__(self, config=config)
+        Anthropic_Chat.__init__(self, config=config)
+
+    def submit_prompt(self, prompt, **kwargs) -> str:
+        raw = super().submit_prompt(prompt, **kwargs)
+        return _clean_llm_response(raw)
+
+
+VANNA_CLASSES = {
+    ("openai", "chromadb"): OpenAI_Vanna,
+    ("ollama", "chromadb"): Ollama_Vanna,
+    ("claude", "chromadb"): Claude_Vanna,
+    ("openai", "numpy"): OpenAI_NumpyVanna,
+    ("ollama", "numpy"): Ollama_NumpyVanna,
+    ("claude", "numpy"): Claude_NumpyVanna,
+}
+
+
 # ── 配置文件读写 ──
 
 CONFIG_PATH = os.path.join(os.path.dirname(__file__), "config.json")
@@ -76,6 +123,9 @@ def save_config(cfg: dict):
 def create_vanna(cfg: dict):
     """根据配置创建 Vanna 实例，返回已连接数据库的 vn 对象。"""
     llm_type = cfg.get("llm_type", "openai")
+    vector_store = cfg.get("vector_store", "chromadb")
+    if vector_store not in ("chromadb", "numpy"):
+        raise ValueError(f"不支持的向量库类型: {vector_store}")
     chromadb_path = cfg.get("chromadb_path", os.path.join(os.path.dirname(__file__), "chromadb_data"))
 
     vanna_config = {
@@ -95,19 +145,19 @@ def create_vanna(cfg: dict):
         client = OpenAI(**client_kwargs)
 
         vanna_config["model"] = cfg.get("model", "gpt-4o-mini")
-        vn = OpenAI_Vanna(config=vanna_config)
+        vn = VANNA_CLASSES[(llm_type, vector_store)](config=vanna_config)
         vn.client = client  # 覆盖默认 client 以支持 base_url
 
     elif llm_type == "ollama":
         vanna_config["model"] = cfg.get("model", "llama3")
         vanna_config["ollama_host"] = cfg.get("ollama_host", "http://localhost:11434")
-        vn = Ollama_Vanna(config=vanna_config)
+        vn = VANNA_CLASSES[(llm_type, vector_store)](config=vanna_config)
 
     elif llm_type == "claude":
         vanna_config["api_key"] = cfg.get("api_key", os.getenv("ANTHROPIC_API_KEY", ""))
         vanna_config["model"] = cfg.get("model", "claude-sonnet-4-5")
         vanna_config["max_tokens"] = cfg.get("max_tokens", 2000)
-        vn = Claude_Vanna(config=vanna_config)
+        vn = VANNA_CLASSES[(llm_type, vector_store)](config=vanna_config)
 
     else:
         raise ValueError(f"不支持的 LLM 类型: {llm_type}")
@@ -118,22 +168,108 @@ def create_vanna(cfg: dict):
     return vn
 
 
-def _connect_db(vn, cfg: dict):
-    """根据配置连接数据库。"""
+class ConnectionPool:
+    """简单的数据库连接池：按需建连，最多保留 size 个空闲连接，线程安全。"""
+
+    def __init__(self, connect, size: int = 4):
+        self._connect = connect
+        self.size = size
+        self._idle = queue.LifoQueue(maxsize=size)
+        self._closed = False
+
+    @contextmanager
+    def connection(self):
+        conn = self._checkout()
+        try:
+            yield conn
+        except Exception:
+            # 出错的连接状态不可信，直接丢弃
+            conn.close()
+            raise
+        else:
+            try:
+                if self._closed:
+                    raise queue.Full
+                self._idle.put_nowait(conn)
+            except queue.Full:
+                conn.close()
+
+    def _checkout(self):
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            return self._connect()
+        # 空闲连接可能已被服务端断开（MySQL wait_timeout），借出前检查一次，断开则重连
+        if hasattr(conn, "ping"):
+            try:
+                conn.ping(reconnect=True)
+            except Exception:
+                try:
+                    conn.close()
+                except Exception:
+                    pass
+                return self._connect()
+        return conn
+
+    def close(self):
+        """关闭所有空闲连接；借出中的连接归还时会被关闭。"""
+        self._closed = True
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+
+
+def _db_connector(cfg: dict):
+    """返回 (dialect, connect)，connect() 每次调用创建一个新的 DB-API 连接。"""
     db_type = cfg.get("db_type", "sqlite")
 
     if db_type == "sqlite":
+        import sqlite3
         db_path = cfg.get("db_path", os.path.join(os.path.dirname(__file__), "demo.db"))
-        vn.connect_to_sqlite(db_path)
+        if not os.path.exists(db_path):
+            raise FileNotFoundError(f"SQLite 数据库不存在: {db_path}")
+        return "SQLite", lambda: sqlite3.connect(db_path, check_same_thread=False)
 
     elif db_type == "mysql":
-        vn.connect_to_mysql(
-            host=cfg.get("db_host", "localhost"),
-            dbname=cfg.get("db_name", ""),
-            user=cfg.get("db_user", "root"),
-            password=cfg.get("db_password", ""),
-            port=cfg.get("db_port", 3306),
-        )
+        import pymysql
+
+        def connect():
+            return pymysql.connect(
+                host=cfg.get("db_host", "localhost"),
+                database=cfg.get("db_name", ""),
+                user=cfg.get("db_user", "root"),
+                password=cfg.get("db_password", ""),
+                port=int(cfg.get("db_port", 3306)),
+                charset="utf8mb4",
+                autocommit=True,  # 避免池中连接停留在旧的事务快照上
+            )
+        return "MySQL", connect
 
     else:
         raise ValueError(f"不支持的数据库类型: {db_type}")
+
+
+def _connect_db(vn, cfg: dict):
+    """根据配置连接数据库：为 vn 建立连接池，并设置 vn.run_sql。"""
+    dialect, connect = _db_connector(cfg)
+    pool = ConnectionPool(connect, size=cfg.get("db_pool_size", 4))
+
+    def run_sql(sql: str) -> pd.DataFrame:
+        with pool.connection() as conn:
+            cursor = conn.cursor()
+            try:
+                cursor.execute(sql)
+                if cursor.description is None:
+                    conn.commit()
+                    return pd.DataFrame()
+                columns = [desc[0] for desc in cursor.description]
+                return pd.DataFrame(cursor.fetchall(), columns=columns)
+            finally:
+                cursor.close()
+
+    vn.dialect = dialect
+    vn.db_pool = pool
+    vn.run_sql = run_sql
+    vn.run_sql_is_set = True
@@ -0,0 +1,158 @@
+"""
+启动预热与就绪状态：在接收流量前把首个请求才会触发的初始化提前做掉。
+
+    1. embedding 模型：加载并实际计算一次
+    2. 向量库：打开 ddl / sql / documentation 三个集合并各检索一次
+    3. 数据库：把连接池中的连接全部建好
+    4. LLM：发一个不消耗 token 的请求（Ollama 为空 prompt 加载模型），建立 TCP/TLS 连接
+
+前三步失败视为未就绪；LLM 预热失败只记录，不影响就绪（查询仍可在首次调用时建连）。
+"""
+import json
+import threading
+import time
+from contextlib import ExitStack
+
+from snapshot import COLLECTIONS
+from vanna_config import create_vanna
+
+WARMUP_TEXT = "warm up"
+
+
+def _warm_embedding(vn):
+    vn.generate_embedding(WARMUP_TEXT)
+
+
+def _warm_collections(vn):
+    for name in COLLECTIONS:
+        collection = getattr(vn, f"{name}_collection")
+        if collection.count():
+            collection.query(query_texts=[WARMUP_TEXT], n_results=1)
+
+
+def _warm_db(vn):
+    # 同时借出 size 个连接，保证池里每个连接都已建立，归还后留在池中
+    with ExitStack() as stack:
+        conns = [stack.enter_context(vn.db_pool.connection()) for _ in range(vn.db_pool.size)]
+        for conn in conns:
+            cursor = conn.cursor()
+            cursor.execute("SELECT 1")
+            cursor.fetchall()
+            cursor.close()
+
+
+def _warm_llm(vn):
+    if hasattr(vn, "ollama_client"):
+        vn.ollama_client.generate(model=vn.model, prompt="", keep_alive=vn.keep_alive)
+        return
+    client = getattr(vn, "client", None)
+    if client is None or not hasattr(client, "models"):
+        return
+    try:
+        client.models.list()
+    except Exception as e:
+        # 部分 OpenAI 兼容服务没有 models 接口，但只要收到 HTTP 响应，连接就已建立
+        if getattr(e, "status_code", None) is None:
+            raise
+
+
+WARMUP_STEPS = (
+    ("embedding", _warm_embedding, True),
+    ("collections", _warm_collections, True),
+    ("database", _warm_db, True),
+    ("llm", _warm_llm, False),
+)
+
+
+class Readiness:
+    """预热进度与就绪状态，线程安全。status: starting / ready / failed。"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._cancelled = threading.Event()
+        self._listeners = []
+        self.status = "starting"
+        self.steps = {}
+
+    @property
+    def ready(self) -> bool:
+        return self.status == "ready"
+
+    def add_listener(self, fn):
+        """注册回调 fn(readiness)，每次预热结束（包括后台重试）时调用。"""
+        self._listeners.append(fn)
+
+    def cancel(self):
+        """停止后台重试（实例被关闭时调用）。"""
+        self._cancelled.set()
+
+    def record(self, name: str, ok: bool, seconds: float, error: str = None):
+        with self._lock:
+            self.steps[name] = {"ok": ok, "seconds": round(seconds, 3), **({"error": error} if error else {})}
+
+    def finish(self, ok: bool):
+        with self._lock:
+            self.status = "ready" if ok else "failed"
+        for fn in self._listeners:
+            try:
+                fn(self)
+            except Exception as e:
+                print(f"就绪状态回调出错：{e}")
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            return {"status": self.status, "steps": dict(self.steps)}
+
+
+def warm_up(vn, readiness: Readiness = None, llm: bool = True) -> Readiness:
+    """依次执行预热步骤并返回就绪状态。"""
+    readiness = readiness or Readiness()
+    ok = True
+    for name, step, required in WARMUP_STEPS:
+        if name == "llm" and not llm:
+            continue
+        start = time.perf_counter()
+        try:
+            step(vn)
+            readiness.record(name, True, time.perf_counter() - start)
+        except Exception as e:
+            readiness.record(name, False, time.perf_counter() - start, str(e))
+            ok = ok and not required
+    readiness.finish(ok)
+    return readiness
+
+
+def _retry_in_background(vn, readiness: Readiness, llm: bool, retry_interval: float, first_now: bool):
+    def run():
+        if not first_now and readiness._cancelled.wait(retry_interval):
+            return
+        while not warm_up(vn, readiness, llm).ready:
+            if readiness._cancelled.wait(retry_interval):
+                return
+
+    threading.Thread(target=run, name="warm-up", daemon=True).start()
+
+
+def create_warm_vanna(cfg: dict, retry_interval: float = 10.0):
+    """create_vanna + 同步预热，可作为 TenantPool 的 factory，让懒加载的数据库回来时也是热的。
+
+    预热失败的实例同样会被缓存，因此在后台每隔 retry_interval 秒重试，直到就绪或实例被关闭。
+    """
+    vn = create_vanna(cfg)
+    vn.readiness = warm_up(vn)
+    if not vn.readiness.ready:
+        _retry_in_background(vn, vn.readiness, True, retry_interval, first_now=False)
+    return vn
+
+
+def write_readiness_file(readiness: Readiness, path: str):
+    """把就绪状态写入文件，供无法提供 HTTP 接口的进程（如 Streamlit）做探针检查。"""
+    with open(path, "w") as f:
+        json.dump(readiness.to_dict(), f, ensure_ascii=False)
+
+
+def start_warm_up(vn, llm: bool = True, retry_interval: float = 10.0) -> Readiness:
+    """在后台线程预热，立即返回 Readiness，供健康检查接口轮询；未就绪时每隔 retry_interval 秒重试。"""
+    readiness = Readiness()
+    _retry_in_background(vn, readiness, llm, retry_interval, first_now=True)
+    return readiness